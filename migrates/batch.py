@@ -2,15 +2,26 @@
 This module implements an Elasticsearch bulk API wrapper.
 """
 
-import time
+import time, random, collections, itertools
+import threading
+import concurrent.futures
 import elasticsearch
+from elasticsearch import helpers as eshelpers
+
+# Prefer a monotonic clock for measuring elapsed time, so that flush timing
+# is immune to wall-clock adjustments. Python 2 doesn't provide one.
+monotonic = getattr(time, 'monotonic', time.time)
 
 class Batch(object):
     """
     Provides a wrapper for the Elasticsearch bulk API.
     """
-    
-    def __init__(self, connection, logger, size=1000, indexes_size=5):
+
+    def __init__(
+        self, connection, logger, size=1000, indexes_size=5,
+        thread_count=4, max_wait=30, max_bytes=5 * 1024 * 1024,
+        target_indexes=None, refresh_interval='30s'
+    ):
         """
         Initialize a Batch object given an Elasticsearch connection object,
         a batch size `size` indicating the number of documents to trigger a
@@ -20,57 +31,274 @@ class Batch(object):
         Note that the latter limit is to help prevent bulk index errors
         resulting from filled queues; the number of items added to the bulk
         queue at once correlates with the number of affected indexes.
+        `thread_count` indicates the number of worker threads used to issue
+        flushed bulk requests in the background, so that whatever is
+        producing actions doesn't stall on Elasticsearch round-trips.
+        `max_wait` indicates a number of seconds after which to flush the
+        queue regardless of how full it is, counted from the first action
+        added since the last flush. This keeps actions from sitting in the
+        queue indefinitely when they are added at a slow trickle.
+        `max_bytes` indicates an approximate payload size in bytes to
+        trigger a flush when exceeded, so that very large documents can't
+        accumulate into a bulk request big enough to time out.
+        When `target_indexes` names the indexes the batch will write to,
+        their refresh interval is raised to `refresh_interval` for the
+        lifetime of the batch and restored afterward. Refreshing less often
+        during bulk ingest substantially reduces segment churn on the
+        Elasticsearch side. Pass `refresh_interval=None` to leave the
+        indexes' settings alone, e.g. when searches must observe writes
+        promptly.
         """
         self.connection = connection
         self.logger = logger
+        # Pre-serialization must encode exactly as the connection itself
+        # would, so that types like datetimes don't come out differently
+        # from documents the client serializes on its own.
+        try:
+            self.serializer = connection.transport.serializer
+        except AttributeError:
+            self.serializer = elasticsearch.serializer.JSONSerializer()
         self.size = size
         self.indexes_size = indexes_size
+        self.thread_count = thread_count
+        self.max_wait = float(max_wait)
+        self.max_bytes = max_bytes
+        self.first_add_time = None
+        self.byte_size = 0
         self.indexes = set()
         self.actions = list()
-        
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=thread_count
+        )
+        self.pending = collections.deque()
+        # Guards logging from the worker threads, which may otherwise
+        # interleave output with the producer and with each other.
+        self.log_lock = threading.Lock()
+        self.target_indexes = target_indexes
+        self.refresh_interval = refresh_interval
+        self.prior_refresh_intervals = None
+
     def add(self, action):
         """
         Add an action to the batch. An action is represented by a dictionary in
         the format described by the Elasticsearch API docs here:
         https://elasticsearch-py.readthedocs.io/en/master/helpers.html#bulk-helpers
         """
+        if not self.actions:
+            self.first_add_time = monotonic()
+        source = action.get('_source')
+        if source is not None and not isinstance(source, (str, bytes)):
+            # Serialize the source once up front. The client's serializer
+            # passes already-serialized strings through verbatim, so this
+            # keeps JSON serialization off the flushing worker threads and
+            # makes the byte-size accounting exact rather than estimated.
+            action['_source'] = source = self.serializer.dumps(source)
         self.actions.append(action)
         self.indexes.add(action['_index'])
-        if len(self.actions) >= self.size or len(self.indexes) >= self.indexes_size:
+        self.byte_size += self.get_action_size(action)
+        if (
+            len(self.actions) >= self.size or
+            len(self.indexes) >= self.indexes_size or
+            self.byte_size >= self.max_bytes or
+            monotonic() - self.first_add_time >= self.max_wait
+        ):
             self.flush()
-    
-    def update(self, actions):
-        for action in actions:
-            self.add(action)
-    
-    def flush(self, max_attempts=3, attempts=0):
+
+    @staticmethod
+    def get_action_size(action):
+        """
+        Get the number of bytes an action will contribute to a bulk request
+        payload, assuming its source has already been serialized by `add`.
+        """
+        source = action.get('_source')
+        if source is None:
+            return 256
+        return len(source) + 256
+
+    def update(self, actions, chunk_size=None):
         """
-        Flush the queue. This invokes the Elasticsearch API's bulk helper.
-        It will attempt the operation several times in case it fails.
+        Add every action in an iterable to the batch. This is cheaper than
+        calling `add` in a loop: actions are staged a chunk at a time with
+        single C-level list and set operations, and the flush thresholds
+        are checked once per chunk rather than once per action.
+        """
+        if chunk_size is None:
+            chunk_size = self.size
+        actions = iter(actions)
+        while True:
+            chunk = list(itertools.islice(actions, chunk_size))
+            if not chunk:
+                break
+            if not self.actions:
+                self.first_add_time = monotonic()
+            for action in chunk:
+                source = action.get('_source')
+                if source is not None and not isinstance(source, (str, bytes)):
+                    action['_source'] = self.serializer.dumps(source)
+            self.actions.extend(chunk)
+            self.indexes.update(action['_index'] for action in chunk)
+            self.byte_size += sum(map(self.get_action_size, chunk))
+            if (
+                len(self.actions) >= self.size or
+                len(self.indexes) >= self.indexes_size or
+                self.byte_size >= self.max_bytes or
+                monotonic() - self.first_add_time >= self.max_wait
+            ):
+                self.flush()
+
+    def flush(self):
+        """
+        Flush the queue. The queued actions are handed off to a background
+        worker thread which invokes the Elasticsearch API's bulk helper, so
+        that the caller can continue queueing further actions while the bulk
+        requests are in flight.
+        Errors encountered by a worker are raised from a later `flush` or
+        `wait` call, whichever first observes the failure.
         """
         self.logger.debug('Flushing queue of %s actions.', len(self.actions))
-        if self.actions:
-            try:
-                elasticsearch.helpers.bulk(self.connection, self.actions)
-            except elasticsearch.helpers.BulkIndexError as e:
-                if attempts < max_attempts:
-                    self.logger.error('Bulk action failed. Trying again in a few seconds...')
-                    time.sleep(5)
-                    self.flush(max_attempts=max_attempts, attempts=attempts + 1)
+        actions = self.actions
+        self.actions = list()
+        self.indexes = set()
+        self.first_add_time = None
+        self.byte_size = 0
+        if not actions:
+            return
+        # Apply backpressure: when the workers can't keep up, wait for the
+        # oldest outstanding bulk request rather than queueing without bound.
+        while len(self.pending) >= 2 * self.thread_count:
+            self.pending.popleft().result()
+        self.pending.append(self.pool.submit(self.flush_actions, actions))
+
+    def wait(self):
+        """Wait until all previously flushed actions have been processed."""
+        while self.pending:
+            self.pending.popleft().result()
+
+    # Statuses indicating a transient failure: the request was rejected
+    # because a queue was full or the service was momentarily unavailable,
+    # and retrying the same action later can be expected to succeed.
+    retry_statuses = (429, 503)
+
+    def flush_actions(self, actions, max_attempts=5):
+        """
+        Send a list of actions to the Elasticsearch bulk API. This runs on
+        a background worker thread.
+        Actions which fail transiently, because Elasticsearch rejected them
+        under load or was momentarily unavailable, are retried several times
+        with an exponential backoff; actions which fail for any other reason
+        produce an error immediately.
+        """
+        attempts = 0
+        chunk_size = self.size
+        while actions:
+            failed = list()
+            errors = list()
+            # The helper yields one result per action, in input order, so
+            # each failure correlates positionally with the action
+            # dictionary already held here. The failure info itself can't
+            # be used to rebuild a retry: per-item rejections carry no
+            # payload at all, and whole-request failures carry only the
+            # serialized source with the routing metadata stripped.
+            results = eshelpers.streaming_bulk(
+                self.connection, actions,
+                chunk_size=chunk_size,
+                raise_on_error=False,
+                raise_on_exception=False
+            )
+            for action, (success, info) in zip(actions, results):
+                if success:
+                    continue
+                # The info dictionary maps the action's operation type to a
+                # description of the failure.
+                result = next(iter(info.values()))
+                if result.get('status') in self.retry_statuses:
+                    failed.append(action)
                 else:
-                    raise e
-            else:
-                if attempts != 0:
-                    self.logger.info(
-                        'Bulk action succeeded after %d attempts.', attempts + 1
-                    )
-        if attempts == 0:
-            self.indexes = set()
-            self.actions = list()
-            time.sleep(1)
-        
+                    errors.append(info)
+            if errors:
+                # Permanent failures won't be fixed by waiting; raise now.
+                raise eshelpers.BulkIndexError(
+                    '%s document(s) failed to index.' % len(errors), errors
+                )
+            if not failed:
+                break
+            attempts += 1
+            if attempts >= max_attempts:
+                raise eshelpers.BulkIndexError(
+                    '%s document(s) failed to index.' % len(failed), failed
+                )
+            # Back off exponentially, with jitter so that concurrent workers
+            # don't all retry in lockstep.
+            backoff = min(30, 0.25 * 2 ** attempts) + random.random() * 0.25
+            with self.log_lock:
+                self.logger.error(
+                    'Bulk action failed for %s documents. '
+                    'Trying again in %.2f seconds...', len(failed), backoff
+                )
+            time.sleep(backoff)
+            # Shrink the request size for the retry: when the cluster is
+            # rejecting work under load, smaller requests are likelier to
+            # fit into its queues.
+            chunk_size = max(1, chunk_size // 2)
+            actions = failed
+        if attempts != 0:
+            with self.log_lock:
+                self.logger.log(
+                    'Bulk action succeeded after %d attempts.', attempts + 1
+                )
+
+    def set_refresh_intervals(self):
+        """
+        Raise the refresh interval on the batch's target indexes for the
+        duration of the bulk ingest, remembering the prior values so that
+        `restore_refresh_intervals` can put them back afterward.
+        """
+        if not self.target_indexes or self.refresh_interval is None:
+            return
+        settings = self.connection.indices.get_settings(
+            index=','.join(self.target_indexes),
+            name='index.refresh_interval',
+            ignore_unavailable=True
+        )
+        if not settings:
+            # None of the target indexes exist yet; the first write will
+            # create them, and there is nothing to toggle until then.
+            return
+        self.prior_refresh_intervals = dict(
+            (index, info.get('settings', {}).get('index', {}).get(
+                'refresh_interval'
+            ))
+            for index, info in settings.items()
+        )
+        self.connection.indices.put_settings(
+            index=','.join(self.target_indexes),
+            body={'index': {'refresh_interval': self.refresh_interval}}
+        )
+
+    def restore_refresh_intervals(self):
+        """
+        Restore the refresh intervals captured by `set_refresh_intervals`.
+        Indexes which had no explicit setting beforehand are reset to the
+        Elasticsearch default.
+        """
+        if self.prior_refresh_intervals is None:
+            return
+        for index, interval in self.prior_refresh_intervals.items():
+            self.connection.indices.put_settings(
+                index=index, body={'index': {'refresh_interval': interval}}
+            )
+        self.prior_refresh_intervals = None
+
     def __enter__(self):
+        self.set_refresh_intervals()
         return self
     def __exit__(self, exception_type, exception_value, traceback):
-        if exception_value is None:
-            self.flush()
+        try:
+            if exception_value is None:
+                self.flush()
+                self.wait()
+        finally:
+            try:
+                self.restore_refresh_intervals()
+            finally:
+                self.pool.shutdown(wait=True)
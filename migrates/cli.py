@@ -2,7 +2,9 @@
 This module implements a command-line interface for migrates.
 """
 
-import os, sys, imp, datetime, argparse, re, json, logging
+import os, sys, datetime, argparse, re, json, logging
+import operator
+import importlib.util
 import elasticsearch
 from elasticsearch import helpers as eshelpers
 
@@ -10,6 +12,14 @@ from . import usage
 from . import migrates
 from .logger import Logger
 
+# Stream large restore files incrementally if ijson is available.
+# Since it's only a performance concern, fall back to loading files
+# in full if the dependency isn't there.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 
 
 def truncate(text, length):
@@ -22,6 +32,36 @@ def truncate(text, length):
 def truncate_description(text, length):
     return truncate(text if text else '(No description.)', length)
 
+# Matches the names of recovery files written prior to migration.
+restore_file_pattern = re.compile(
+    r'migrates\.(indexes|templates|migrations)\.(\d{14})\.json'
+)
+
+def parse_restore_file_timestamp(digits):
+    """
+    Parse the timestamp portion of a recovery file name, a string of
+    digits formatted like "%Y%m%d%H%M%S".
+    """
+    return datetime.datetime(
+        int(digits[0:4]), int(digits[4:6]), int(digits[6:8]),
+        int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+    )
+
+def iterate_restore_items(path):
+    """
+    Iterate the elements of a json list stored in a restore file.
+    When ijson is available the file is parsed incrementally, so that
+    arbitrarily large restore files can be processed without first
+    materializing the entire list in memory.
+    """
+    with open(path, 'rb') as restore_file:
+        if ijson is not None:
+            for item in ijson.items(restore_file, 'item'):
+                yield item
+        else:
+            for item in json.load(restore_file):
+                yield item
+
 
 
 class Arguments(object):
@@ -44,17 +84,37 @@ class Arguments(object):
         # Make Elasticsearch logger quieter
         logging.getLogger('elasticsearch').setLevel(logging.CRITICAL)
     
+    # Keyword arguments used when constructing an Elasticsearch connection.
+    # The connection pool should be at least as large as the number of bulk
+    # worker threads, and compressing request bodies substantially reduces
+    # the bytes put on the wire by bulk indexing.
+    connection_options = {
+        'maxsize': 32,
+        'http_compress': True,
+        'sniff_on_connection_fail': True,
+        'timeout': 60,
+        'retry_on_timeout': True,
+        'max_retries': 3,
+    }
+
     def get_connection(self):
         if self.connection is None:
             logger = self.get_logger()
-            if not self.options.host:
-                self.connection = elasticsearch.Elasticsearch()
+            hosts = self.options.host
+            connection_options = dict(self.connection_options)
+            if migrates.json_serializer is not None:
+                connection_options['serializer'] = migrates.json_serializer
+            if not hosts:
+                self.connection = elasticsearch.Elasticsearch(
+                    **connection_options
+                )
                 logger.log('Acquired connection to local Elasticsearch host.')
             else:
-                self.connection = elasticsearch.Elasticsearch(self.options.host)
+                self.connection = elasticsearch.Elasticsearch(
+                    hosts, **connection_options
+                )
                 logger.log('Acquired connection to Elasticsearch host%s %s.',
-                    '' if len(self.options.host) == 1 else 's',
-                    ', '.join(self.options.host)
+                    '' if len(hosts) == 1 else 's', ', '.join(hosts)
                 )
         return self.connection
     
@@ -82,6 +142,7 @@ class Arguments(object):
             history_index=self.options.history_index,
             history_doc_type=self.options.history_doc_type,
             dummy_index_prefix=self.options.dummy_index_prefix,
+            queue_backend=self.options.queue_backend,
         )
     
     def import_paths(self):
@@ -101,6 +162,7 @@ class Arguments(object):
             if not os.path.exists(path):
                 logger.log('Nonexistent migration package path "%s".', path)
                 return False
+            search_locations = None
             if path.endswith('.py'):
                 module_path = path
             else:
@@ -109,11 +171,15 @@ class Arguments(object):
                     logger.log('Migration directory "%s" is not a Python module or package.', path)
                     logger.log('Paths must refer to Python files or directories containing an "__init__.py".')
                     return False
-            with open(module_path, 'U') as module_file:
-                imp.load_module(
-                    'migrates.imported_package%s' % i,
-                    module_file, module_path, ('.py', 'U', imp.PY_SOURCE)
-                )
+                # Allow imported packages to import their own submodules.
+                search_locations = [path]
+            spec = importlib.util.spec_from_file_location(
+                'migrates.imported_package%s' % i, module_path,
+                submodule_search_locations=search_locations
+            )
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
         return True
     
     @classmethod
@@ -138,7 +204,9 @@ class Arguments(object):
     
     @staticmethod
     def options_parser(command=None):
-        parser = argparse.ArgumentParser(usage=usage.general, add_help=False)
+        parser = argparse.ArgumentParser(
+            usage=usage.command('general'), add_help=False
+        )
         # General options
         parser.add_argument('-p', '--path', type=str, nargs='+')
         parser.add_argument('-h', '--host', type=str, nargs='+')
@@ -166,6 +234,9 @@ class Arguments(object):
         parser.add_argument('--dummy-index-prefix', type=str,
             default=migrates.Migrates.default_dummy_index_prefix
         )
+        parser.add_argument('--queue-backend', type=str,
+            choices=('memory', 'disk'), default='memory'
+        )
         # Command-specific options
         if command == 'migrations':
             parser.add_argument('--pending', action='store_true')
@@ -188,7 +259,7 @@ class Arguments(object):
             )
         ):
             self.get_logger().log('Invalid number of command arguments.')
-            print(usage.commands[self.command])
+            print(usage.command(self.command))
             return False
         else:
             return True
@@ -201,7 +272,7 @@ def __main__(args=None):
     if args.options.version:
         version(args)
     elif args.command is None or args.command not in commands:
-        print(usage.general)
+        print(usage.command('general'))
     else:
         commands[args.command](args)
 
@@ -209,13 +280,13 @@ def __main__(args=None):
 
 def show_help(args):
     if len(args.args) == 0:
-        print(usage.general)
+        print(usage.command('general'))
     elif len(args.args) >= 1:
-        if args.args[0] in usage.commands:
-            print(usage.commands[args.args[0]])
+        if args.args[0] in usage.command_templates:
+            print(usage.command(args.args[0]))
         else:
             print('Unknown command "%s".' % args.args[0])
-            print(usage.help)
+            print(usage.command('help'))
 
 
 
@@ -297,29 +368,41 @@ def show_history(args):
             )
         es_filter = {'range': {'timestamp': range_filter}}
     try:
-        any_history = False
-        for document in eshelpers.scan(
-            client=args.get_connection(),
-            index=args.options.history_index,
-            doc_type=args.options.history_doc_type,
-            preserve_order=True,
-            query={
-                "query": es_filter,
-                "sort": [
-                    {"timestamp": {"order": "asc"}},
-                    {"migration_date": {"order": "asc"}}
-                ]
-            }
-        ):
-            any_history = True
-            timestamp = datetime.datetime.strptime(  # e.g. "2017-04-01T13:18:59.850701"
-                document['_source']['timestamp'][:19], '%Y-%m-%dT%H:%M:%S'
+        # Scan without server-side ordering so that the scroll can read
+        # shards in parallel, pulling only the fields that are shown; the
+        # entries are sorted client-side instead, which is cheap since
+        # history indexes are small.
+        entries = [
+            document['_source']
+            for document in eshelpers.scan(
+                client=args.get_connection(),
+                index=args.options.history_index,
+                doc_type=args.options.history_doc_type,
+                size=5000,
+                query={
+                    "query": es_filter,
+                    "_source": [
+                        "timestamp", "migration_date", "name", "description"
+                    ]
+                }
             )
-            logger.log('%s: "%s", %s',
-                timestamp.strftime(args.date_format), document['_source']['name'],
-                truncate_description(document['_source']['description'], 60)
+        ]
+        entries.sort(key=lambda entry: (
+            entry['timestamp'], entry.get('migration_date', '')
+        ))
+        # Bind the per-entry lookups to locals outside the loop.
+        log = logger.log
+        truncate = truncate_description
+        for source in entries:
+            # Stored timestamps are already ISO-8601 to the second (possibly
+            # followed by fractional seconds or a "Z"), and the displayed
+            # format is identical up to the trailing "Z", so slicing avoids
+            # a strptime/strftime round-trip per document.
+            timestamp = source['timestamp'][:19] + 'Z'
+            log('%s: "%s", %s',
+                timestamp, source['name'], truncate(source['description'], 60)
             )
-        if not any_history:
+        if not entries:
             logger.log('No migration history for this time period.')
     except elasticsearch.exceptions.NotFoundError:
         logger.log('No migration history index is present in Elasticsearch.')
@@ -335,12 +418,16 @@ def show_migrations(args):
         migrations = args.get_migrates().get_pending_migrations()
     else:
         logger.log('Showing all registered migrations.')
-        migrations = [migration for migration in migrates.Migrates.registry.values()]
-        migrations.sort(key=lambda migration: migration.date)
+        migrations = sorted(
+            migrates.Migrates.registry.values(),
+            key=operator.attrgetter('date')
+        )
     if migrations:
+        log = logger.log
+        date_format = args.date_format
         for migration in migrations:
-            logger.log('%s: "%s", %s',
-                migration.date.strftime(args.date_format), migration.name,
+            log('%s: "%s", %s',
+                migration.date.strftime(date_format), migration.name,
                 truncate_description(migration.description, 60)
             )
     else:
@@ -394,15 +481,11 @@ def restore_history(args):
         return
     logger = args.get_logger()
     path = args.args[0]
-    with open(path, 'rb') as restore_file:
-        history = list(json.load(restore_file))
-    if not logger.confirm('Write %s migration history entries from "%s"?',
-        len(history), path
-    ):
+    if not logger.confirm('Write migration history entries from "%s"?', path):
         logger.log('Exiting without modifying data.')
         return
     mig = args.get_migrates()
-    mig.write_migration_history(migration_actions=history)
+    mig.write_migration_history(migration_actions=iterate_restore_items(path))
     logger.log('Finished restoring migration history.')
 
 
@@ -437,17 +520,16 @@ def restore_cleanup(args):
         'templates': 0,
         'migrations': 0,
     }
-    pattern = r'migrates\.(indexes|templates|migrations)\.(\d{14})\.json'
-    for name in os.listdir(args.options.restore_path):
-        path = os.path.join(args.options.restore_path, name)
-        if os.path.isfile(path):
-            match = re.match(pattern, name)
-            if match:
-                timestamp = datetime.datetime.strptime(match.group(2), '%Y%m%d%H%M%S')
-                if not older_than or timestamp < older_than:
-                    old_files[match.group(1)].append(path)
-                else:
-                    not_old[match.group(1)] += 1
+    for entry in os.scandir(args.options.restore_path):
+        if not entry.is_file():
+            continue
+        match = restore_file_pattern.match(entry.name)
+        if match:
+            timestamp = parse_restore_file_timestamp(match.group(2))
+            if not older_than or timestamp < older_than:
+                old_files[match.group(1)].append(entry.path)
+            else:
+                not_old[match.group(1)] += 1
     for key in old_files:
         if not_old[key] < args.options.keep_files:
             old_files[key].sort(reverse=True)
@@ -488,7 +570,14 @@ def remove_dummies(args):
         logger.log('Previewing dummy index removal.')
     connection = args.get_connection()
     dummy_pattern = args.options.dummy_index_prefix + '*'
-    dummies = connection.indices.get(index=dummy_pattern)
+    # Only the index names are needed here; the cat API returns just those,
+    # where indices.get would return every matching index's full mappings
+    # and settings only for them to be thrown away.
+    dummies = [
+        row['index'] for row in connection.cat.indices(
+            index=dummy_pattern, h='index', format='json'
+        )
+    ]
     if not dummies:
         logger.log('No dummy indexes to remove.')
         return
@@ -3,25 +3,30 @@ This module is a depenency of migrates used to support showing extra detail for
 indexes affected by migration.
 """
 
-import traceback, copy, collections, json
-
-# Use long integers for both Python 2 and 3
-try:
-    x = long(0)
-except NameError:
-    long = int
+import traceback, collections, json, operator
 
 class MigratesIndexDetail(object):
+    __slots__ = (
+        'detail', 'logger',
+        'index_touched', 'index_deleted',
+        'migration_touched', 'migration_deleted', 'migration_errors',
+        'shown_doc_types', 'document_json', 'document_name',
+        'document_index', 'document_type', 'document_detail',
+        'document_touched_by', 'document_deleted_by', 'document_errored_by',
+        'document_exceptions',
+    )
+
     def __init__(self, detail, logger):
         self.detail = detail
         self.logger = logger
-        self.index_touched = collections.defaultdict(long)
-        self.index_deleted = collections.defaultdict(long)
-        self.migration_touched = collections.defaultdict(long)
-        self.migration_deleted = collections.defaultdict(long)
-        self.migration_errors = collections.defaultdict(long)
+        self.index_touched = collections.Counter()
+        self.index_deleted = collections.Counter()
+        self.migration_touched = collections.Counter()
+        self.migration_deleted = collections.Counter()
+        self.migration_errors = collections.Counter()
         self.shown_doc_types = collections.defaultdict(set)
-        self.document = None
+        self.document_json = None
+        self.document_name = None
         self.document_index = None
         self.document_type = None
         self.document_detail = False
@@ -32,15 +37,30 @@ class MigratesIndexDetail(object):
             lambda: collections.defaultdict(list)
         )
     
+    def bulk_pre(self, index, doc_type, count):
+        """
+        To be called before applying migrations to a group of documents
+        sharing an index and document type, so that callers which already
+        group their documents can record a whole group in one increment.
+        """
+        self.document_index = index
+        self.document_type = doc_type
+        self.index_touched[index] += count
+
     def pre(self, document):
         """
         To be called before applying migrations to a document.
         """
-        self.document_index = document['_index']
-        self.document_type = document['_type']
-        self.index_touched[self.document_index] += 1
+        self.bulk_pre(document['_index'], document['_type'], 1)
         if self.detail and self.document_type not in self.shown_doc_types[self.document_index]:
-            self.document = copy.deepcopy(document)
+            # Snapshot the document as JSON rather than deep-copying it;
+            # a single C-level serialization is far cheaper than walking the
+            # dictionary tree in Python, and the snapshot is only ever used
+            # to print the document's "before" state anyway.
+            self.document_json = json.dumps(document, default=str)
+            self.document_name = '/'.join((
+                document['_index'], document['_type'], document['_id']
+            ))
             self.document_detail = True
     
     def touch(self, migration):
@@ -73,9 +93,7 @@ class MigratesIndexDetail(object):
         """
         if not self.document_detail:
             return
-        document_name = '/'.join((
-            self.document['_index'], self.document['_type'], self.document['_id']
-        ))
+        document_name = self.document_name
         self.logger.log(
             'Document "%s" was touched by %s migrations: %s.',
             document_name, len(self.document_touched_by),
@@ -97,14 +115,15 @@ class MigratesIndexDetail(object):
             ))
             self.logger.log(
                 'The original document %s:\n%s',
-                document_name, json.dumps(self.document, indent=2)
+                document_name, json.dumps(json.loads(self.document_json), indent=2)
             )
             self.logger.log(
                 'The migrated document %s:\n%s',
                 post_document_name, json.dumps(document, indent=2)
             )
         self.shown_doc_types[self.document_index].add(self.document_type)
-        self.document = None
+        self.document_json = None
+        self.document_name = None
         self.document_index = None
         self.document_detail = False
         self.document_touched_by = set()
@@ -113,11 +132,17 @@ class MigratesIndexDetail(object):
     
     def report(self):
         # Sort by number of touched documents
-        index_info = sorted(self.index_touched.items(), key=lambda i: -i[1])
+        index_info = sorted(
+            self.index_touched.items(), key=operator.itemgetter(1), reverse=True
+        )
         # Sort by migration date
-        migration_info = sorted(self.migration_touched.items(), key=lambda i: i[0].date)
+        migration_info = sorted(
+            self.migration_touched.items(), key=lambda i: i[0].date
+        )
         # Sort by number of errors
-        error_info = sorted(self.migration_errors.items(), key=lambda i: -i[1])
+        error_info = sorted(
+            self.migration_errors.items(), key=operator.itemgetter(1), reverse=True
+        )
         # Now actually report all that info!
         for index, touched in index_info:
             self.logger.log('In index "%s": %s documents touched, %s documents deleted.',
@@ -142,3 +167,25 @@ class MigratesIndexDetail(object):
                 self.logger.log(
                     '\n'.join(traceback.format_exc(e) for e in exceptions[:3])
                 )
+
+
+class MigratesIndexSummaryDetail(MigratesIndexDetail):
+    """
+    A leaner stand-in for MigratesIndexDetail used when no detail patterns
+    were requested. It maintains only the counters that feed the
+    end-of-run report, so the per-document accounting amounts to a couple
+    of counter increments rather than per-document snapshot bookkeeping.
+    """
+    __slots__ = ()
+
+    def pre(self, document):
+        # Only the index is remembered, for attributing deletions; no
+        # document ever qualifies for a detailed snapshot.
+        self.document_index = document['_index']
+        self.index_touched[self.document_index] += 1
+
+    def touch(self, migration):
+        self.migration_touched[migration] += 1
+
+    def post(self, document):
+        pass
@@ -2,7 +2,7 @@
 This module implements the logger used by migrates.
 """
 
-import os, sys, traceback, time, datetime
+import os, sys, io, atexit, collections, functools, threading, traceback, time
 
 # Use coloring to prettify the log if colorama is available.
 # Since the colors aren't essential, just log boring style-less text
@@ -13,6 +13,32 @@ try:
 except ImportError:
     colors = False
 
+# Build the ANSI prefix for each log level once at import time, rather
+# than concatenating colorama attribute lookups on every log call.
+if colors:
+    color_debug = colorama.Fore.CYAN
+    color_error = colorama.Fore.RED + colorama.Style.BRIGHT
+    color_important = colorama.Fore.YELLOW + colorama.Style.BRIGHT
+    color_reset = colorama.Style.RESET_ALL
+else:
+    color_debug = color_error = color_important = color_reset = ''
+
+# ANSI escapes work natively everywhere except Windows, so only Windows
+# needs colorama's stdout wrapper - and only once per process, not once
+# per Logger. Elsewhere the wrapper would just intercept every write for
+# no benefit. Strip escapes when output is redirected away from a console.
+if colors and sys.platform == 'win32':
+    colorama.init(strip=not sys.stdout.isatty())
+
+@functools.lru_cache(maxsize=256)
+def colored_template(prefix, text):
+    """
+    Wrap a log template in a color prefix and the reset suffix. Log call
+    sites reuse a small set of template strings, so caching the colored
+    form avoids rebuilding the same concatenation on every call.
+    """
+    return prefix + text + color_reset
+
 # Make confirmation prompts work for both Python 2 and Python 3
 # http://stackoverflow.com/a/21731110/3478907
 try:
@@ -25,45 +51,218 @@ class Logger(object):
     For logging messages to the console and, optionally, to a log file.
     """
     
-    def __init__(self, path=None, verbose=False, quiet=False, silent=False, yes=False):
+    # Slots make the flag and sink attributes C-level descriptors rather
+    # than dict entries; the leveled log methods touch several of them on
+    # every call.
+    __slots__ = (
+        'verbose', 'quiet', 'silent', 'yes', 'memory_log',
+        'write_lock', 'flush_interval', 'flush_thread', 'closed',
+        'local', 'stage_buffers', 'stage_size',
+        'path', 'output_file', 'output_buffer', 'stdout',
+    )
+    
+    # When a burst, such as a large traceback, grows the output buffer past
+    # this size, the buffer is released after draining instead of cleared,
+    # so the memory doesn't stay resident for the rest of the run.
+    soft_max_buffer_size = 128 * 1024
+    
+    def __init__(
+        self, path=None, verbose=False, quiet=False, silent=False, yes=False,
+        memory=False, memory_size=65536
+    ):
         self.verbose = verbose
         self.quiet = quiet
         self.silent = silent
         self.yes = yes
+        # When the memory flag is set, log lines are staged unformatted in a
+        # bounded in-memory buffer and written out in one go when the logger
+        # is flushed or closed, keeping all I/O and formatting out of
+        # whatever loop is being logged about. Only the most recent
+        # `memory_size` lines are retained.
+        self.memory_log = collections.deque(maxlen=memory_size) if memory else None
+        # Writes stay buffered for throughput; a background daemon thread
+        # flushes the log file periodically so that a crash can lose at
+        # most a few seconds of lines. The lock covers only the writes
+        # themselves - formatting always happens outside it.
+        self.write_lock = threading.Lock()
+        self.flush_interval = 5
+        self.flush_thread = None
+        self.closed = False
+        # File-bound lines are staged in a small per-thread queue and
+        # drained to the writer in batches, so concurrent threads don't
+        # contend on the write lock for every single line. Deque appends
+        # and popleft are safe against each other without further locking.
+        self.local = threading.local()
+        self.stage_buffers = []
+        self.stage_size = 64
         self.path = None
         self.output_file = None
+        self.output_buffer = bytearray()
+        # When stdout isn't a terminal (output piped to a file or another
+        # process), wrap it in a larger buffer so that logging doesn't pay
+        # a flush per line; terminals keep line buffering so output stays
+        # responsive.
+        self.stdout = sys.stdout
+        try:
+            if not sys.stdout.isatty():
+                self.stdout = io.TextIOWrapper(
+                    io.BufferedWriter(sys.stdout.buffer, 65536)
+                )
+                atexit.register(self.stdout.flush)
+        except (AttributeError, ValueError):
+            pass
         self.set_path(path)
-        if colors:
-            colorama.init()
     
     def set_path(self, path):
         """Set a file path to log to, in addition to stdout."""
         self.path = path
         self.close()
         if path:
-            self.output_file = open(path, 'ab')
-            timestamp = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
-            self.output_file.write('Beginning migrates log from %s.\n' % timestamp)
+            # Write through a raw file descriptor and an explicit byte
+            # buffer rather than a buffered file object: encoded lines
+            # accumulate until the buffer is large enough to be worth a
+            # syscall, and each drain is exactly one os.write with no
+            # intervening Python file-layer dispatch.
+            self.output_file = os.open(
+                path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+            self.output_buffer = bytearray()
+            # The close call above marked the logger closed; clear the flag
+            # so the flush loop below actually loops.
+            self.closed = False
+            # time.strftime over gmtime is a bit quicker than the datetime
+            # equivalent and sidesteps the deprecated utcnow.
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            self.emit(
+                ('Beginning migrates log from %s.\n' % timestamp).encode('utf-8')
+            )
+            if self.flush_thread is None or not self.flush_thread.is_alive():
+                self.flush_thread = threading.Thread(target=self.flush_loop)
+                self.flush_thread.daemon = True
+                self.flush_thread.start()
+    
+    def emit(self, data):
+        """
+        Stage encoded bytes for the log file, draining the buffer to the
+        file descriptor with a single os.write once it grows past 64KB.
+        """
+        with self.write_lock:
+            self.output_buffer += data
+            if len(self.output_buffer) >= 65536:
+                os.write(self.output_file, self.output_buffer)
+                self.reset_output_buffer()
+    
+    def reset_output_buffer(self):
+        """
+        Empty the output buffer after a drain, dropping its backing memory
+        entirely when a burst has grown it past the soft cap. Callers must
+        hold the write lock.
+        """
+        if len(self.output_buffer) > self.soft_max_buffer_size:
+            self.output_buffer = bytearray()
+        else:
+            del self.output_buffer[:]
+    
+    def flush_output(self):
+        """Drain whatever is staged for the log file, regardless of size."""
+        with self.write_lock:
+            if self.output_buffer:
+                os.write(self.output_file, self.output_buffer)
+                self.reset_output_buffer()
+    
+    def flush_loop(self):
+        """Periodically flush the log file. Runs on a daemon thread."""
+        while not self.closed:
+            time.sleep(self.flush_interval)
+            output_file = self.output_file
+            if output_file is None:
+                continue
+            try:
+                for buf in list(self.stage_buffers):
+                    self.drain(buf)
+                self.flush_output()
+            except (ValueError, OSError):
+                # The file was closed out from under the thread; harmless.
+                pass
+    
+    def flush_memory_log(self):
+        """
+        Format the lines staged by a memory-mode logger and write them to
+        the log file, or to stdout when no log file is set, in one batch.
+        """
+        if not self.memory_log:
+            return
+        lines = [
+            (text % args if args else text) + '\n'
+            for text, args in self.memory_log
+        ]
+        self.memory_log.clear()
+        if self.output_file is not None:
+            self.emit(''.join(lines).encode('utf-8'))
+        elif not self.silent:
+            self.stdout.writelines(lines)
     
     def close(self):
         """Close the associated log file, if any."""
+        self.closed = True
+        if self.memory_log is not None:
+            self.flush_memory_log()
+        if self.stdout is not sys.stdout:
+            self.stdout.flush()
         if self.output_file is not None:
-            os.close(self.output_file)
-            self.output_file = None
+            for buf in list(self.stage_buffers):
+                self.drain(buf)
+            with self.write_lock:
+                if self.output_buffer:
+                    os.write(self.output_file, self.output_buffer)
+                    del self.output_buffer[:]
+                os.close(self.output_file)
+                self.output_file = None
     
     def show(self, stdout, text, *args):
         """Log a line of text."""
+        # Bind the attributes touched more than once to locals; on the
+        # logging hot path the repeated LOAD_ATTR cost is measurable.
+        output_file = self.output_file
         stdout = stdout and not self.silent
-        if stdout or self.output_file is not None:
-            formatted = text % args if args else text
+        if not (stdout or output_file is not None):
+            # Nothing will receive the message, so don't even format it.
+            return
+        if self.memory_log is not None:
+            # Defer formatting and I/O alike; `flush_memory_log` settles up.
+            self.memory_log.append((text, args))
+            return
+        formatted = (text % args if args else text) + '\n'
         if stdout:
-            print(formatted)
-        if self.output_file is not None:
-            self.output_file.write(formatted)
-            self.output_file.write('\n')
+            self.stdout.write(formatted)
+        if output_file is not None:
+            buf = getattr(self.local, 'lines', None)
+            if buf is None:
+                buf = self.local.lines = collections.deque()
+                with self.write_lock:
+                    self.stage_buffers.append(buf)
+            buf.append(formatted)
+            if len(buf) >= self.stage_size:
+                self.drain(buf)
+    
+    def drain(self, buf):
+        """
+        Write one staged batch of log lines to the log file, as a single
+        writelines call under the write lock.
+        """
+        lines = []
+        while True:
+            try:
+                lines.append(buf.popleft())
+            except IndexError:
+                break
+        if lines and self.output_file is not None:
+            self.emit(''.join(lines).encode('utf-8'))
         
     def log(self, text, *args):
         """Log a line of text."""
+        if self.silent and self.output_file is None:
+            return
         self.show(not self.quiet, text, *args)
     
     def debug(self, text, *args):
@@ -71,38 +270,79 @@ class Logger(object):
         Log a line of text meant to communicate something trivial, but only
         if the logger is set to log verbosely.
         """
-        if self.verbose:
-            if colors:
-                text = colorama.Fore.CYAN + text + colorama.Style.RESET_ALL
-            self.show(not self.quiet, text, *args)
+        if not self.verbose:
+            return
+        if self.silent and self.output_file is None:
+            return
+        self.show(not self.quiet, text, *args)
+    
+    def log_raw(self, text):
+        """
+        Log a line of preformatted text. Hot call sites which already hold
+        the final string can use this to skip argument packing and the
+        formatting branch in `log`.
+        """
+        if self.silent and self.output_file is None:
+            return
+        self.show(not self.quiet, text)
+    
+    def debug_raw(self, text):
+        """Preformatted counterpart to `debug`, like `log_raw` is to `log`."""
+        if not self.verbose:
+            return
+        if self.silent and self.output_file is None:
+            return
+        self.show(not self.quiet, text)
+    
+    def debug_colored(self, text, *args):
+        """Colored variant of `debug`, swapped in when colorama is present."""
+        if not self.verbose:
+            return
+        if self.silent and self.output_file is None:
+            return
+        self.show(not self.quiet, colored_template(color_debug, text), *args)
     
     def error(self, text, *args):
         """Log a line of text meant to communicate an error."""
-        if colors:
-            text = (
-                colorama.Fore.RED + colorama.Style.BRIGHT +
-                text + colorama.Style.RESET_ALL
-            )
+        if self.silent and self.output_file is None:
+            return
         self.show(True, text, *args)
     
+    def error_colored(self, text, *args):
+        """Colored variant of `error`, swapped in when colorama is present."""
+        if self.silent and self.output_file is None:
+            return
+        self.show(True, colored_template(color_error, text), *args)
+    
     def important(self, text, *args):
         """Log a line of text meant to communicate something very important."""
-        if colors:
-            text = (
-                colorama.Fore.YELLOW + colorama.Style.BRIGHT +
-                text + colorama.Style.RESET_ALL
-            )
+        if self.silent and self.output_file is None:
+            return
         self.show(True, text, *args)
+    
+    def important_colored(self, text, *args):
+        """Colored variant of `important`, swapped in when colorama is present."""
+        if self.silent and self.output_file is None:
+            return
+        self.show(True, colored_template(color_important, text), *args)
         
     def exception(self, text, *args, **kwargs):
         """Log a line of text and information about an exception."""
+        if self.silent and self.output_file is None:
+            return
         if 'exception' in kwargs:
-            info = kwargs['exception']
+            exception = kwargs['exception']
+            formatted_traceback = ''.join(traceback.format_exception(
+                type(exception), exception,
+                getattr(exception, '__traceback__', None)
+            ))
         else:
-            info = sys.exc_info()[-1]
+            formatted_traceback = ''.join(
+                traceback.format_exception(*sys.exc_info())
+            )
         formatted = text % args if args else text
         self.error(formatted)
-        self.show(True, traceback.format_exc(info))
+        self.show(True, formatted_traceback)
     
     def confirm(self, text, *args):
         """
@@ -112,6 +352,9 @@ class Logger(object):
         if self.yes:
             return True
         else:
+            if self.stdout is not sys.stdout:
+                # Make sure buffered output appears before the prompt.
+                self.stdout.flush()
             formatted = text % args if args else text
             value = input(formatted + ' (y/n) ')
             return value == 'y' or value == 'Y'
@@ -121,13 +364,29 @@ class Logger(object):
         if self.quiet or self.silent:
             time.sleep(seconds)
         else:
-            print('Waiting for %d seconds...' % seconds)
+            stdout = self.stdout
+            stdout.write('Waiting for %d seconds...\n' % seconds)
             step = max(1, seconds // 10)
             left = seconds % step
-            for _ in range(seconds // step):
-                sys.stdout.write('.')
-                sys.stdout.flush()
+            # On a terminal, redraw the whole dot line with a carriage
+            # return so each tick is one write; piped output just collects
+            # plain dots in the buffer and settles for one flush at the end.
+            interactive = stdout is sys.stdout
+            for i in range(seconds // step):
+                if interactive:
+                    stdout.write('\r' + '.' * (i + 1))
+                    stdout.flush()
+                else:
+                    stdout.write('.')
                 time.sleep(step)
             time.sleep(left)
-            sys.stdout.write('\n')
-            sys.stdout.flush()
+            stdout.write('\n')
+            stdout.flush()
+
+# Whether color output is available is settled at import time, so the
+# colored variants can replace the plain leveled methods on the class
+# itself - no per-call or even per-instance dispatch remains.
+if colors:
+    Logger.debug = Logger.debug_colored
+    Logger.error = Logger.error_colored
+    Logger.important = Logger.important_colored
@@ -4,13 +4,24 @@ This module implements migrates' actual migration process.
 
 from __future__ import division
 
-import sys, os, re, copy, datetime, collections, json
+import sys, os, re, datetime, functools, json, tempfile, gc, time
+import threading, queue
+import concurrent.futures
 import elasticsearch
 from elasticsearch import helpers as eshelpers
 
+# Prefer orjson for JSON work when it is available; its C-level
+# serializer is several times faster than the standard library's on the
+# nested dictionaries this module shuffles around. Like colorama for the
+# logger, it is strictly optional.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from .batch import Batch
 from .logger import Logger
-from .detail import MigratesIndexDetail
+from .detail import MigratesIndexDetail, MigratesIndexSummaryDetail
 
 
 
@@ -19,6 +30,81 @@ __versionstr__ = '.'.join(str(i) for i in __version__)
 
 
 
+def json_dumps(value):
+    """Serialize a value to a JSON string with the fastest available codec."""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value)
+
+def json_loads(text):
+    """Parse a JSON string with the fastest available codec."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def json_copy(value):
+    """Copy a JSON-compatible value via a serialize/parse round-trip."""
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(value))
+    return json.loads(json.dumps(value))
+
+if orjson is not None:
+    import elasticsearch.serializer
+    class OrjsonSerializer(elasticsearch.serializer.JSONSerializer):
+        """
+        A client serializer backed by orjson, so that every request and
+        response body - most importantly the bulk payloads and scroll
+        pages - is encoded and decoded at C speed. Falls back on the
+        base class's `default` hook for types JSON can't express.
+        """
+        def dumps(self, data):
+            if isinstance(data, (str, bytes)):
+                return data
+            try:
+                return orjson.dumps(data, default=self.default).decode('utf-8')
+            except (ValueError, TypeError) as e:
+                raise elasticsearch.exceptions.SerializationError(data, e)
+        def loads(self, data):
+            try:
+                return orjson.loads(data)
+            except (ValueError, TypeError) as e:
+                raise elasticsearch.exceptions.SerializationError(data, e)
+    json_serializer = OrjsonSerializer()
+else:
+    json_serializer = None
+
+def stream_json_object(output_file, items):
+    """
+    Incrementally write key/value pairs to a file as a JSON object, one
+    entry at a time, so that the whole serialized form never has to be
+    held in memory at once.
+    """
+    output_file.write('{')
+    first = True
+    for key, value in items:
+        if first:
+            first = False
+        else:
+            output_file.write(',')
+        output_file.write(json_dumps(key))
+        output_file.write(':')
+        output_file.write(json_dumps(value))
+    output_file.write('}')
+
+def stream_json_list(output_file, items):
+    """Like `stream_json_object`, but writes an iterable as a JSON array."""
+    output_file.write('[')
+    first = True
+    for item in items:
+        if first:
+            first = False
+        else:
+            output_file.write(',')
+        output_file.write(json_dumps(item))
+    output_file.write(']')
+
+
+
 class MigratesFailState(object):
     """Enumerates constants recognized by the `handle_migration_failure` method."""
     
@@ -108,6 +194,7 @@ class Migrates(object):
     
     FailState = MigratesFailState
     IndexDetail = MigratesIndexDetail
+    IndexSummaryDetail = MigratesIndexSummaryDetail
     Result = MigratesResult
     
     registry = {}  # Will contain Migration objects
@@ -142,6 +229,11 @@ class Migrates(object):
         except KeyError:
             raise ValueError('Found no migration with name "%s".' % name)
     
+    @classmethod
+    def remove(cls, name):
+        """Remove a Migration object from the registry by its name."""
+        cls.registry.pop(name, None)
+    
     @classmethod
     def contains(cls, name):
         return name in cls.registry
@@ -164,9 +256,26 @@ class Migrates(object):
         history_index=default_history_index,
         history_doc_type=default_history_doc_type,
         dummy_index_prefix=default_dummy_index_prefix,
+        bulk_thread_count=4, bulk_chunk_size=1000,
+        bulk_max_chunk_bytes=10 * 1024 * 1024,
+        queue_backend='memory',
     ):
         # The Elasticsearch connection object used to interact with the API.
-        self.connection = elasticsearch.Elasticsearch() if connection is None else connection
+        # When no connection is given, construct one tuned for this module's
+        # workload: enough pooled connections for the parallel bulk senders
+        # and scroll slices, compressed request and response bodies since
+        # document copies are bandwidth-heavy, and retries on timeouts.
+        if connection is None:
+            connection_options = {
+                'http_compress': True,
+                'maxsize': max(32, 4 * bulk_thread_count),
+                'sniff_on_connection_fail': True,
+                'timeout': 120, 'retry_on_timeout': True, 'max_retries': 3,
+            }
+            if json_serializer is not None:
+                connection_options['serializer'] = json_serializer
+            connection = elasticsearch.Elasticsearch(**connection_options)
+        self.connection = connection
         # A Logger object used for outputting information about the migration process.
         self.logger = Logger() if logger is None else logger
         # Name of template to use for the migrates history index.
@@ -185,27 +294,65 @@ class Migrates(object):
         self.detail = detail
         # Whether to keep dummy indexes rather than cleaning them up afterwards.
         self.keep_dummies = keep_dummies
+        # Tuning knobs for bulk document copies: how many sender threads to
+        # use per copy, and how many documents/bytes to put in each request.
+        self.bulk_thread_count = bulk_thread_count
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_max_chunk_bytes = bulk_max_chunk_bytes
+        # How document copies hand scanned documents to the bulk senders:
+        # "memory" moves them through bounded in-memory queues, "disk"
+        # spools them through a file first so that scanning is never
+        # throttled by bulk-indexing speed.
+        if queue_backend not in ('memory', 'disk'):
+            raise ValueError(
+                'Unknown queue backend "%s"; expected "memory" or "disk".'
+                % queue_backend
+            )
+        self.queue_backend = queue_backend
         # Path to write restore files to. (Files written to help recover from a failed migration.)
         self.restore_path = restore_path
         # Will be a set of index names affected by the migrations being evaluated.
         self.affected = None
+        # Will list the dummy index names for the affected indexes, built
+        # once so cleanup paths don't rebuild it.
+        self.dummy_indexes = None
         # Will represent settings and mappings for affected Elasticsearch indexes.
         self.settings = None
+        # Will map dummy index names to the refresh/replica settings their
+        # source indexes had, so they can be restored after bulk population.
+        self.dummy_ingest_settings = {}
         # Will represent Elasticsearch templates prior to migration.
         self.original_templates = None
         # Will represent Elasticsearch templates after migration.
         self.updated_templates = None
         # Will represent the time at which migration was initiated.
         self.timestamp = datetime.datetime.utcnow()
+        # Format the timestamp once up front; strftime is costly enough to
+        # matter when these strings are stamped onto many history actions.
+        self.timestamp_str = self.timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.timestamp_id = self.timestamp.strftime('%Y%m%d%H%M%S')
         # Will represent a set of migration names which are to be processed.
         self.migrations = None
+        self.migration_pipelines = None
+        self.document_validator = self.validate_transformed_document
+        self.refresh_between = True
+        # A single-threaded executor for writing advisory restore files in
+        # the background, overlapping their disk I/O with the Elasticsearch
+        # round-trips that follow.
+        self.io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Will cache the history actions built for the pending migrations,
+        # shared by the restore-file writer and the history writer.
+        self.migration_actions = None
+        # Will cache the merged document transformation map for the
+        # migrations being processed.
+        self.document_transformations = None
         # Paths to files recorded in case the information is needed for recovery.
         if restore_path is None:
             self.restore_templates_path = None
             self.restore_indexes_path = None
             self.restore_migrations_path = None
         else:
-            path_date = self.timestamp.strftime('%Y%m%d%H%M%S')
+            path_date = self.timestamp_id
             self.restore_templates_path = os.path.join(
                 restore_path, 'migrates.templates.' + path_date + '.json'
             )
@@ -218,6 +365,16 @@ class Migrates(object):
         # Will store Elasticsearch version information
         self.es_version = self.get_es_version()
         self.verbose('Found Elasticsearch version %s.', self.es_version)
+        # Parse the major version once; note that taking the first character
+        # of the version string would misread versions of 10 and above.
+        self.es_major_version = (
+            int(self.es_version.split('.', 1)[0]) if self.es_version else 0
+        )
+        self.keyword_field = (
+            {"type": "keyword", "index": True}
+            if self.es_major_version >= 5
+            else {"type": "string", "index": "not_analyzed"}
+        )
     
     def get_es_version(self):
         response = self.connection.transport.perform_request(
@@ -229,7 +386,14 @@ class Migrates(object):
             return response['version']['number']
     
     def batch(self, *args, **kwargs):
-        """Get a batch object for handling bulk actions."""
+        """
+        Get a batch object for handling bulk actions. The instance's bulk
+        tuning knobs are applied as defaults; callers with unusually small
+        or large documents can still override them per batch.
+        """
+        kwargs.setdefault('size', self.bulk_chunk_size)
+        kwargs.setdefault('max_bytes', self.bulk_max_chunk_bytes)
+        kwargs.setdefault('thread_count', self.bulk_thread_count)
         return Batch(self.connection, self.logger, *args, **kwargs)
     
     def log(self, text, *args):
@@ -279,29 +443,39 @@ class Migrates(object):
     def match_pattern(cls, pattern, target):
         """
         Helper function used to match a string against an Elasticsearch-style
-        pattern.
+        pattern. Most patterns in practice are literal names containing no
+        wildcard at all, and those are compared directly rather than going
+        through a regular expression.
         """
-        return re.match(cls.get_pattern_regex(pattern), target)
+        if '*' not in pattern:
+            return pattern == target
+        return cls.get_pattern_regex(pattern).match(target) is not None
     
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def get_pattern_regex(pattern):
         """
-        Helper function used to construct a regular expression from an
-        Elasticsearch-style pattern.
+        Helper function used to construct a compiled regular expression from
+        an Elasticsearch-style pattern. The same few patterns are matched
+        against a great many index and document type names during migration,
+        so the compiled expressions are memoized.
         """
-        return re.escape(pattern).replace('\\*', '.*') + '$'
+        return re.compile(re.escape(pattern).replace('\\*', '.*') + '$')
     
     def get_performed_migrations(self):
         """Get a set of names of migrations that have already been performed."""
         try:
+            # The set is order-insensitive, so let the scroll read shards
+            # in parallel instead of forcing an ordered scan, and pull only
+            # the one field that is actually used.
             migration_history = set(
                 document['_source']['name']
                 for document in eshelpers.scan(
                     client=self.connection,
-                    preserve_order=True,
                     index=self.history_index,
                     doc_type=self.history_doc_type,
-                    query=self.scan_query
+                    size=5000,
+                    query={"query": {"match_all": {}}, "_source": ["name"]}
                 )
             )
             return migration_history
@@ -336,10 +510,7 @@ class Migrates(object):
         For Elasticsearch 5.x and later, return a "keyword" field mapping.
         For prior versions, return a "not_analyzed" "string" field mapping.
         """
-        if self.es_version and int(self.es_version[0]) >= 5:
-            return {"type": "keyword", "index": True}
-        else:
-            return {"type": "string", "index": "not_analyzed"}
+        return self.keyword_field
 
     def enforce_history_template(self):
         """Make sure that the template used by migrates is present in ES."""
@@ -367,31 +538,47 @@ class Migrates(object):
         )
 
     def write_migration_history(self, migration_actions=None):
-        """Write migration history information to Elasticsearch."""
+        """
+        Write migration history information to Elasticsearch.
+        Accepts any iterable of history actions, including a generator, so
+        that callers restoring a large history dump can stream entries
+        through without holding them all in memory at once.
+        """
         if self.no_history:
             return
         if migration_actions is None:
-            migration_actions = [
-                self.migration_action(migration) for migration in self.migrations
-            ]
+            migration_actions = self.get_migration_actions()
         try:
-            self.log('Writing %s migration history entries.', len(migration_actions))
+            self.log('Writing migration history entries.')
             self.enforce_history_template()
         except Exception:  # Not a fatal error
             self.log_exception('Failed to enforce existence of migrates history template.')
         if self.dry:
             return
-        with self.batch() as batch:
-            batch.update(migration_actions)
+        state = {'count': 0}
+        def counted(actions):
+            for action in actions:
+                state['count'] += 1
+                yield action
+        # Naming the history index lets the batch suspend its refresh
+        # interval while entries stream in; the explicit refresh below
+        # settles visibility either way.
+        with self.batch(target_indexes=[self.history_index]) as batch:
+            batch.update(counted(migration_actions))
+        # Make the new entries visible right away: nothing here waits out
+        # the index's refresh interval, and callers - the history command,
+        # the tests - may search the history immediately.
+        self.connection.indices.refresh(index=self.history_index, ignore=404)
+        self.log('Wrote %s migration history entries.', state['count'])
             
     def migration_action(self, migration):
         return {
             '_op_type': 'index',
             '_index': self.history_index,
             '_type': self.history_doc_type,
-            '_id': migration.name + '/' + self.timestamp.strftime('%Y%m%d%H%M%S'),
+            '_id': migration.name + '/' + self.timestamp_id,
             '_source': {
-                'timestamp': self.timestamp.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'timestamp': self.timestamp_str,
                 'migration_date': migration.date.strftime('%Y-%m-%dT%H:%M:%SZ'),
                 'name': migration.name,
                 'description': migration.description,
@@ -399,13 +586,36 @@ class Migrates(object):
             }
         }
     
+    def get_migration_actions(self):
+        """
+        Get the history actions for the migrations being processed, building
+        them only on first use - the restore-file writer and the history
+        writer record identical actions.
+        """
+        if self.migration_actions is None:
+            self.migration_actions = [
+                self.migration_action(migration) for migration in self.migrations
+            ]
+        return self.migration_actions
+    
+    def get_document_transformations(self):
+        """
+        Get the merged document transformation map for the migrations being
+        processed, merging it only on first use.
+        """
+        if self.document_transformations is None:
+            self.document_transformations = (
+                Migration.merge_document_transformations(self.migrations)
+            )
+        return self.document_transformations
+    
     def write_original_templates(self):
         if self.restore_templates_path is None:
             self.verbose('Skipping writing original template data.')
             return
         self.log('Writing original template data to path "%s".', self.restore_templates_path)
         with open(self.restore_templates_path, 'w') as output_file:
-            json.dump(self.original_templates, output_file)
+            stream_json_object(output_file, self.original_templates.items())
     
     def write_affected_indexes(self):
         if self.restore_indexes_path is None:
@@ -413,18 +623,15 @@ class Migrates(object):
             return
         self.log('Writing affected index information to path "%s".', self.restore_indexes_path)
         with open(self.restore_indexes_path, 'w') as output_file:
-            json.dump(list(self.affected), output_file)
+            stream_json_list(output_file, self.affected)
     
     def write_pending_migrations(self):
         if self.restore_migrations_path is None:
             self.verbose('Skipping writing migration information.')
             return
         self.log('Writing migration information to path "%s".', self.restore_migrations_path)
-        migrations = [
-            self.migration_action(migration) for migration in self.migrations
-        ]
         with open(self.restore_migrations_path, 'w') as output_file:
-            json.dump(migrations, output_file)
+            stream_json_list(output_file, self.get_migration_actions())
     
     def get_templates(self):
         """Get a dictionary of templates currently present in Elasticsearch."""
@@ -439,12 +646,18 @@ class Migrates(object):
         except KeyError:
             return result
         
-    def migrate(self, migrations=None):
+    def migrate(self, migrations=None, refresh_between=True):
         """
         This is were the action happens!
         Optionally accepts an iterable of migrations to be processed, otherwise
         registered migrations which are currently pending will be processed.
+        When refresh_between is False, the flush and segment merge normally
+        performed between populating the dummy indexes and scanning them are
+        skipped; the documents are still made visible to the scans. This
+        trades some mid-migration durability for less fsync load and is
+        mostly useful for tests and for throwaway data.
         """
+        self.refresh_between = refresh_between
         
         # Get migrations that should be applied.
         try:
@@ -452,11 +665,19 @@ class Migrates(object):
                 self.migrations = self.get_pending_migrations()
             else:
                 self.migrations = list(migrations)
+            self.migration_pipelines = {}
+            # Internal migrations such as reindexes are known to preserve
+            # document shape, so their output can skip per-field checks.
+            self.document_validator = (
+                self.trusted_transformed_document
+                if all(migration.internal for migration in self.migrations)
+                else self.validate_transformed_document
+            )
         except BaseException as e:
             return self.handle_migration_failure(self.FailState.GetMigrations, e)
         
         # If there are no migrations to be applied, just bail now.
-        if not migrations:
+        if not self.migrations:
             return
         
         # Retrieve current Elasticsearch templates.
@@ -468,9 +689,12 @@ class Migrates(object):
         # Record original template information. Can be used to recover
         # Elasticsearch state if normal recovery fails.
         # If migration fails here: No recovery action is required.
+        restore_futures = []
         try:
             if not self.dry:
-                self.write_original_templates()
+                restore_futures.append(
+                    self.io_pool.submit(self.write_original_templates)
+                )
         except BaseException as e:
             return self.handle_migration_failure(self.FailState.BackupTemplates, e)
         
@@ -480,7 +704,9 @@ class Migrates(object):
         # If migration fails here: No recovery action is required.
         try:
             if not self.dry:
-                self.write_pending_migrations()
+                restore_futures.append(
+                    self.io_pool.submit(self.write_pending_migrations)
+                )
         except BaseException as e:
             return self.handle_migration_failure(self.FailState.PendingMigrations, e)
         
@@ -488,8 +714,13 @@ class Migrates(object):
         # If migration fails here: No recovery action is required.
         try:
             self.affected = self.get_affected_indexes()
+            self.dummy_indexes = [
+                self.get_dummy_index(index) for index in self.affected
+            ]
             if not self.dry:
-                self.write_affected_indexes()
+                restore_futures.append(
+                    self.io_pool.submit(self.write_affected_indexes)
+                )
             if self.affected:
                 self.log(
                     'Found %s affected indexes: %s', len(self.affected),
@@ -509,6 +740,16 @@ class Migrates(object):
         except BaseException as e:
             return self.handle_migration_failure(self.FailState.TransformTemplates, e)
         
+        # The restore files are only advisory until Elasticsearch data is
+        # actually modified, so their writes have been running in the
+        # background; they must all be safely on disk before the first
+        # destructive step below. Any write error surfaces here.
+        try:
+            for future in restore_futures:
+                future.result()
+        except BaseException as e:
+            return self.handle_migration_failure(self.FailState.BackupTemplates, e)
+        
         # Create and populate dummy indexes.
         # If migration fails here: Dummy indexes should be removed.
         try:
@@ -516,6 +757,7 @@ class Migrates(object):
                 self.create_dummy_indexes()
                 self.wait()
                 self.populate_dummy_indexes()
+                self.finalize_dummy_indexes()
         except BaseException as e:
             return self.handle_migration_failure(self.FailState.CreateDummies, e)
             
@@ -543,9 +785,7 @@ class Migrates(object):
         # to remove dummies warrants no recovery action.
         try:
             if not self.dry:
-                self.remove_indexes([
-                    self.get_dummy_index(index) for index in self.affected
-                ])
+                self.remove_indexes(self.dummy_indexes)
         except BaseException:
             # Not a fatal error
             # TODO: Tell the user how to clean the dummies up
@@ -586,15 +826,31 @@ class Migrates(object):
         by a migration's `transform_documents` method matches the index name.
         """
         self.verbose('Determining affected indexes.')
-        transformations = Migration.merge_document_transformations(self.migrations)
+        transformations = self.get_document_transformations()
         affected = set()  # Names of indexes affected by any transformation
-        for pattern in transformations.keys():
+        patterns = list(transformations.keys())
+        def resolve(index):
+            # The cat API returns just the matching index names, rather
+            # than the full settings payloads get_settings would fetch
+            # only to have their keys read. It lists closed indexes along
+            # with open ones without needing to be asked.
+            affected.update(
+                row['index'] for row in self.connection.cat.indices(
+                    index=index, h='index', format='json'
+                )
+            )
+        if patterns:
             try:
-                affected.update(self.connection.indices.get_settings(
-                    index=pattern, params={'expand_wildcards': 'open,closed'}
-                ))
+                resolve(','.join(patterns))
             except elasticsearch.exceptions.NotFoundError:
-                pass  # Index doesn't exist, and that's ok.
+                # One concrete pattern with no matching index fails the
+                # whole combined request, so fall back to resolving the
+                # patterns individually.
+                for pattern in patterns:
+                    try:
+                        resolve(pattern)
+                    except elasticsearch.exceptions.NotFoundError:
+                        pass  # Index doesn't exist, and that's ok.
         if not self.affected:
             self.verbose('Found no affected indexes.')
         else:
@@ -616,26 +872,37 @@ class Migrates(object):
                 }
         self.verbose('Retrieving index mappings and settings.')
         result = Result()
-        for index in indexes:
-            self.verbose('Retrieving settings for index "%s".', index)
-            try:
-                target = self.get_dummy_index(index) if dummies else index
-                result.mappings[index] = self.connection.indices.get_mapping(
-                    index=target
-                )[target]['mappings']
-                settings = self.connection.indices.get_settings(
-                    index=target
-                )[target]['settings']
-                # Elasticsearch 5.x includes an "index.creation_date" field in
-                # responses but does not accept the field for index creation.
-                # Since that's what this data will be used for later, remove
-                # the field now.
-                if 'index' in settings and 'creation_date' in settings['index']:
-                    del settings['index']
-                result.settings[index] = settings
-                    
-            except elasticsearch.exceptions.NotFoundError:
+        targets = dict(
+            (self.get_dummy_index(index) if dummies else index, index)
+            for index in indexes
+        )
+        if not targets:
+            return result
+        # Fetch everything in two multi-index requests instead of two
+        # round-trips per index; missing indexes simply don't appear in
+        # the responses.
+        joined = ','.join(targets)
+        all_mappings = self.connection.indices.get_mapping(
+            index=joined, params={'ignore_unavailable': 'true'}
+        )
+        all_settings = self.connection.indices.get_settings(
+            index=joined, params={'ignore_unavailable': 'true'}
+        )
+        for target, index in targets.items():
+            if target not in all_mappings or target not in all_settings:
                 self.verbose('Could not get settings for nonexistent index "%s".', index)
+                continue
+            result.mappings[index] = all_mappings[target]['mappings']
+            settings = all_settings[target]['settings']
+            # Elasticsearch 5.x and later include read-only bookkeeping
+            # fields in responses which are rejected when passed back to
+            # index creation. Since that's what this data will be used for
+            # later, remove just those fields now - keeping the rest of the
+            # index settings, such as shard counts, intact.
+            if 'index' in settings:
+                for key in ('creation_date', 'uuid', 'version', 'provided_name'):
+                    settings['index'].pop(key, None)
+            result.settings[index] = settings
         return result
     
     def create_dummy_indexes(self):
@@ -654,40 +921,296 @@ class Migrates(object):
                 if not self.dry:
                     self.connection.indices.delete(dummy)
             if not self.dry:
-                self.connection.indices.create(
-                    index=dummy, body=self.settings[index]
-                )
+                # Copy the body so the stashed settings, which recovery uses
+                # to recreate the original index, stay untouched. Refresh
+                # and replication are disabled during the bulk copy; both
+                # multiply the cost of every write and neither is needed
+                # until the dummy is actually read from.
+                body = json_copy(self.settings[index])
+                index_settings = body.setdefault(
+                    'settings', {}
+                ).setdefault('index', {})
+                self.dummy_ingest_settings[dummy] = {
+                    'refresh_interval':
+                        index_settings.get('refresh_interval'),
+                    'number_of_replicas':
+                        index_settings.get('number_of_replicas'),
+                    'translog.durability':
+                        index_settings.get('translog', {}).get('durability'),
+                }
+                index_settings['refresh_interval'] = '-1'
+                index_settings['number_of_replicas'] = '0'
+                # Relax transaction log durability while the dummy is being
+                # filled: sync once every thirty seconds instead of once per
+                # bulk request, and let the log grow larger before flushing.
+                # An explicit flush in finalize_dummy_indexes makes the data
+                # durable before anything destructive happens.
+                index_settings.setdefault('translog', {}).update({
+                    'durability': 'async',
+                    'sync_interval': '30s',
+                    'flush_threshold_size': '1gb',
+                })
+                self.connection.indices.create(index=dummy, body=body)
+    
+    def finalize_dummy_indexes(self):
+        """
+        Restore the refresh, replica, and translog durability settings that
+        were suspended while the dummy indexes were being populated, flush
+        so that every copied document is safely on disk before the original
+        indexes are touched, and refresh so that every copied document is
+        visible to the scans that follow. The flush and segment merge are
+        skipped when the migration was started with refresh_between=False.
+        """
+        self.log('Restoring ingest settings on dummy indexes.')
+        for index in self.affected:
+            dummy = self.get_dummy_index(index)
+            original = self.dummy_ingest_settings.get(dummy, {})
+            self.connection.indices.put_settings(index=dummy, body={'index': {
+                'refresh_interval':
+                    original.get('refresh_interval') or '1s',
+                'number_of_replicas':
+                    original.get('number_of_replicas') or '1',
+                'translog.durability':
+                    original.get('translog.durability') or 'request',
+            }})
+            if self.refresh_between:
+                self.connection.indices.flush(index=dummy)
+            self.connection.indices.refresh(index=dummy)
+            if self.refresh_between:
+                try:
+                    # Consolidating segments makes the subsequent scans
+                    # cheaper, but a failure here is no reason to abort the
+                    # migration.
+                    self.connection.indices.forcemerge(
+                        index=dummy, max_num_segments=5
+                    )
+                except Exception:
+                    self.log_exception(
+                        'Failed to merge segments of dummy index "%s".', dummy
+                    )
         
+    def get_index_slice_count(self, index):
+        """
+        Get the number of scroll slices to read an index with: one per
+        primary shard, so that each slice maps to an independent shard read.
+        """
+        try:
+            return max(1, int(
+                self.settings[index]['settings']['index']['number_of_shards']
+            ))
+        except (KeyError, TypeError, ValueError):
+            return 1
+    
+    def queued_actions(self, actions, depth=4):
+        """
+        Consume an iterable of bulk actions on a producer thread, handing
+        chunks across a small bounded queue. Scrolling the next documents
+        out of Elasticsearch then overlaps with bulk-writing the documents
+        already read, instead of the two alternating in one thread.
+        """
+        output = queue.Queue(maxsize=depth)
+        done = object()
+        state = {'abort': False}
+        def send(item):
+            # Poll rather than block indefinitely, so that the producer
+            # can still notice an abort when the consumer has abandoned
+            # this generator and nothing will ever drain the queue.
+            while not state['abort']:
+                try:
+                    output.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        def produce():
+            try:
+                chunk = []
+                for action in actions:
+                    chunk.append(action)
+                    if len(chunk) >= self.bulk_chunk_size:
+                        if not send(chunk):
+                            return
+                        chunk = []
+                if chunk and not send(chunk):
+                    return
+                send(done)
+            except BaseException as e:
+                send(e)
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        try:
+            while True:
+                item = output.get()
+                if item is done:
+                    break
+                elif isinstance(item, BaseException):
+                    raise item
+                for action in item:
+                    yield action
+        finally:
+            # Reached on normal completion, on a raised producer error,
+            # and when the consumer abandons the generator mid-stream:
+            # release the producer so it stops scrolling and exits,
+            # leaving no scroll context held open behind it.
+            state['abort'] = True
+            while True:
+                try:
+                    output.get_nowait()
+                except queue.Empty:
+                    break
+    
+    def spooled_actions(self, actions):
+        """
+        Spool serialized bulk actions through a file on disk before
+        yielding them to the bulk senders. Unlike `queued_actions`, the
+        producer runs to completion regardless of how quickly the actions
+        are consumed, so a slow or stalled cluster can never hold a scroll
+        open indefinitely. The spool file is written under the restore
+        path when one is configured and is kept in place if the process
+        dies before the actions have all been sent.
+        """
+        spool_dir = self.restore_path or tempfile.gettempdir()
+        fd, spool_path = tempfile.mkstemp(
+            prefix='migrates.spool.', suffix='.json', dir=spool_dir
+        )
+        count = 0
+        with os.fdopen(fd, 'w') as spool_file:
+            for action in actions:
+                spool_file.write(json_dumps(action))
+                spool_file.write('\n')
+                count += 1
+        self.verbose(
+            'Spooled %s bulk actions to "%s".', count, spool_path
+        )
+        with open(spool_path, 'r') as spool_file:
+            for line in spool_file:
+                yield json_loads(line)
+        os.remove(spool_path)
+    
+    def buffered_actions(self, actions):
+        """
+        Route an iterable of bulk actions through the configured queue
+        backend on their way to the bulk senders.
+        """
+        if self.queue_backend == 'disk':
+            return self.spooled_actions(actions)
+        return self.queued_actions(actions)
+    
+    def reindex_index_documents(self, source, destination):
+        """
+        Copy every document from one index into another with the server-side
+        reindex API. Unlike `copy_index_documents`, the documents never
+        leave the cluster, and slicing the task automatically parallelizes
+        the copy across the source's shards without any client-side
+        workers - the right trade for the recovery path, where the client
+        may be on a thin connection and no transformation is needed.
+        """
+        task = self.connection.reindex(
+            body={
+                'source': {'index': source},
+                'dest': {'index': destination},
+            },
+            wait_for_completion=False,
+            params={'slices': 'auto', 'refresh': 'false'},
+        )['task']
+        while True:
+            status = self.connection.tasks.get(task_id=task)
+            if status.get('completed'):
+                break
+            time.sleep(2)
+        response = status.get('response') or {}
+        failures = response.get('failures') or []
+        if failures:
+            raise eshelpers.BulkIndexError(
+                '%s document(s) failed to copy.' % len(failures), failures
+            )
+        if status.get('error'):
+            raise ValueError(
+                'Reindexing documents from "%s" to "%s" failed: %s' % (
+                    source, destination, json_dumps(status['error'])
+                )
+            )
+    
+    def copy_index_documents(self, source, destination, slices=None):
+        """
+        Copy every document from one index into another. The scroll is
+        split into independent slices, by default one per primary shard of
+        the source index, and each slice is consumed by its own worker
+        thread feeding its own bulk pipeline. Reading the shards
+        concurrently rather than through a single ordered scroll scales the
+        copy with the index's shard count.
+        """
+        if slices is None:
+            slices = self.get_index_slice_count(source)
+        def copy_slice(slice_id):
+            query = dict(self.scan_query)
+            if slices > 1:
+                query['slice'] = {'id': slice_id, 'max': slices}
+            actions = (
+                {
+                    '_op_type': 'index',
+                    '_index': destination,
+                    '_type': document['_type'],
+                    '_id': document['_id'],
+                    '_source': document['_source']
+                }
+                for document in eshelpers.scan(
+                    client=self.connection,
+                    preserve_order=False,
+                    index=source,
+                    size=self.bulk_chunk_size,
+                    scroll='5m',
+                    request_timeout=120,
+                    query=query
+                )
+            )
+            # parallel_bulk overlaps the serialization of one chunk with
+            # the network round-trip of the next; its result generator must
+            # be consumed for any work to happen at all.
+            errors = []
+            for success, info in eshelpers.parallel_bulk(
+                self.connection, self.buffered_actions(actions),
+                thread_count=self.bulk_thread_count,
+                chunk_size=self.bulk_chunk_size,
+                max_chunk_bytes=self.bulk_max_chunk_bytes,
+                raise_on_error=False
+            ):
+                if not success:
+                    self.error('Failed to copy document: %s', info)
+                    errors.append(info)
+            if errors:
+                raise eshelpers.BulkIndexError(
+                    '%s document(s) failed to copy.' % len(errors), errors
+                )
+        if slices <= 1:
+            copy_slice(0)
+            return
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=slices)
+        try:
+            # Materialize the submissions first so every slice is in
+            # flight before the first result is waited upon.
+            futures = [pool.submit(copy_slice, i) for i in range(slices)]
+            for future in futures:
+                future.result()
+        finally:
+            pool.shutdown(wait=True)
+    
     def populate_dummy_indexes(self):
         """
         Copy documents from their original affected indexes into their
         corresponding dummy indexes.
         """
         self.log('Populating dummy indexes.')
-        with self.batch() as batch:
-            for index in self.affected:
-                dummy = self.get_dummy_index(index)
-                self.log(
-                    'Populating dummy index "%s" with documents from "%s".',
-                    dummy, index
-                )
-                if self.dry:
-                    continue
-                batch.update(
-                    {
-                        '_op_type': 'index',
-                        '_index': dummy,
-                        '_type': document['_type'],
-                        '_id': document['_id'],
-                        '_source': document['_source']
-                    }
-                    for document in eshelpers.scan(
-                        client=self.connection,
-                        preserve_order=True,
-                        index=index,
-                        query=self.scan_query
-                    )
-                )
+        for index in self.affected:
+            dummy = self.get_dummy_index(index)
+            self.log(
+                'Populating dummy index "%s" with documents from "%s".',
+                dummy, index
+            )
+            if self.dry:
+                continue
+            self.copy_index_documents(index, dummy)
                 
     def remove_dummy_indexes(self):
         if self.keep_dummies:
@@ -695,22 +1218,46 @@ class Migrates(object):
         else:
             self.log('Removing %s dummy indexes.', len(self.affected))
             try:
-                self.remove_indexes([
-                    self.get_dummy_index(index) for index in self.affected
-                ])
+                if self.dummy_indexes is not None:
+                    dummies = self.dummy_indexes
+                else:
+                    dummies = [
+                        self.get_dummy_index(index) for index in self.affected
+                    ]
+                self.remove_indexes(dummies)
             except Exception:
                 self.log_exception('Failed to remove dummy indexes.')
 
     def remove_indexes(self, indexes):
         """Remove all index names given in an iterable."""
+        indexes = list(indexes)
         self.verbose('Removing %s indexes.', len(indexes))
         for index in indexes:
             self.log('Removing index "%s".', index)
+        if self.dry or not indexes:
+            return
+        def delete_group(group):
             try:
-                if not self.dry:
-                    self.connection.indices.delete(index=index)
+                self.connection.indices.delete(
+                    index=','.join(group),
+                    params={'ignore_unavailable': 'true'}
+                )
             except elasticsearch.exceptions.NotFoundError:
-                self.verbose('Failed to remove nonexistent index "%s".', index)
+                self.verbose('Failed to remove nonexistent indexes.')
+        # The delete API takes a comma-separated list, so the indexes can
+        # go in one request rather than one round-trip each - split only
+        # to keep each request URL comfortably within length limits.
+        group = []
+        group_length = 0
+        for index in indexes:
+            if group and group_length + len(index) + 1 > 3800:
+                delete_group(group)
+                group = []
+                group_length = 0
+            group.append(index)
+            group_length += len(index) + 1
+        if group:
+            delete_group(group)
 
     def get_updated_templates(self):
         """
@@ -719,7 +1266,10 @@ class Migrates(object):
         resulting dictionary.
         """
         self.verbose('Transforming templates with %s migrations.', len(self.migrations))
-        updated = copy.deepcopy(self.original_templates)
+        # Template bodies are JSON-origin data with no custom classes or
+        # cycles, so a serialize/parse round-trip through the C json
+        # machinery copies them much faster than the generic deepcopy walk.
+        updated = json_copy(self.original_templates)
         for migration in self.migrations:
             self.verbose('Transforming template with migration "%s".', migration)
             updated = migration.transform_templates(updated)
@@ -738,35 +1288,58 @@ class Migrates(object):
                 self.match_pattern(pattern, name) for pattern in self.detail
             )
         self.log('Writing migrated templates.')
-        unchanged = set()
-        any_changes = False
-        for name, body in original.items():
-            if not(name in updated and body == updated[name]):
-                any_changes = True
-                if name not in updated:
-                    self.log('Removing deleted template "%s".', name)
-                else:
-                    self.log('Removing changed template "%s".', name)
-                    if template_detail(name):
-                        self.log('Original template "%s":\n%s', name, body)
-                        self.log('Updated template "%s":\n%s', name, updated[name])
-                if not self.dry:
-                    self.connection.indices.delete_template(name=name)
+        # Partition the templates up front so that the common case, where
+        # most templates are untouched, does a single summary log line
+        # rather than one verbose line per unchanged template.
+        unchanged = set(
+            name for name in original
+            if name in updated and original[name] == updated[name]
+        )
+        removing = [name for name in original if name not in unchanged]
+        adding = [name for name in updated if name not in unchanged]
+        self.verbose('Found %s unchanged templates.', len(unchanged))
+        # Template requests are independent of one another within a phase,
+        # so issue each phase's requests concurrently; removals must still
+        # complete before additions, since a changed template is removed
+        # and then recreated under the same name.
+        def run_concurrently(calls):
+            if not calls:
+                return
+            pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(8, len(calls))
+            )
+            try:
+                for future in [pool.submit(call) for call in calls]:
+                    future.result()
+            finally:
+                pool.shutdown(wait=True)
+        removals = []
+        for name in removing:
+            if name not in updated:
+                self.log('Removing deleted template "%s".', name)
             else:
-                self.verbose('Found unchanged template "%s".', name)
-                unchanged.add(name)
-        for name, body in updated.items():
-            if name not in unchanged:
-                any_changes = True
-                if name in original:
-                    self.log('Adding changed template "%s".', name)
-                else:
-                    self.log('Adding new template "%s".', name)
-                if not self.dry:
-                    self.connection.indices.put_template(
-                        name=name, body=body, create=True
-                    )
-        if not any_changes:
+                self.log('Removing changed template "%s".', name)
+                if template_detail(name):
+                    self.log('Original template "%s":\n%s', name, original[name])
+                    self.log('Updated template "%s":\n%s', name, updated[name])
+            if not self.dry:
+                removals.append(functools.partial(
+                    self.connection.indices.delete_template, name=name
+                ))
+        run_concurrently(removals)
+        additions = []
+        for name in adding:
+            if name in original:
+                self.log('Adding changed template "%s".', name)
+            else:
+                self.log('Adding new template "%s".', name)
+            if not self.dry:
+                additions.append(functools.partial(
+                    self.connection.indices.put_template,
+                    name=name, body=updated[name], create=True
+                ))
+        run_concurrently(additions)
+        if not (removing or adding):
             self.log('No templates were affected.')
 
     @staticmethod
@@ -782,40 +1355,218 @@ class Migrates(object):
             document['_op_type'] = 'index'
         return document
     
+    @staticmethod
+    def trusted_transformed_document(document, add_op_type):
+        """
+        Validator used in place of `validate_transformed_document` when every
+        pending migration is internal: the transforms are migrates' own, so
+        the document shape is guaranteed and the membership checks would be
+        pure overhead on the per-document hot path.
+        """
+        if add_op_type and '_op_type' not in document:
+            document['_op_type'] = 'index'
+        return document
+    
+    def get_migration_pipeline(self, index, doc_type):
+        """
+        Get the list of (migration, transform) pairs applying to documents
+        of a given index and document type, building and caching the list
+        the first time each pair is seen. Migrations with no transform
+        applying to the pair are left out of the list entirely, so that
+        documents they don't apply to never pay for them.
+        """
+        key = (index, doc_type)
+        pipeline = self.migration_pipelines.get(key)
+        if pipeline is None:
+            pipeline = []
+            for migration in self.migrations:
+                transform = migration.get_transform(index, doc_type)
+                if transform is not None:
+                    pipeline.append((migration, transform))
+            self.migration_pipelines[key] = pipeline
+        return pipeline
+    
+    def migrate_document(self, document, detail):
+        """
+        Apply the pending migrations to one scanned document. Returns the
+        transformed document as a bulk action, or None when a migration
+        removed the document or this is a dry run.
+        The migrations are applied via the pipeline resolved for the
+        document's index and document type as scanned; migrations without
+        an applicable transformation are skipped outright.
+        """
+        if not self.dry:
+            document['_index'] = self.get_original_index(document['_index'])
+        detail.pre(document)
+        pipeline = self.get_migration_pipeline(
+            document['_index'], document['_type']
+        )
+        for migration, transform in pipeline:
+            detail.touch(migration)
+            try:
+                document = transform(document)
+            except Exception as e:
+                detail.error(migration, e)
+                if self.dry:
+                    break
+                else:
+                    raise e
+            if document is None:  # Returning None removes the document
+                detail.delete(migration)
+                break
+        detail.post(document)
+        if document is not None and not self.dry:
+            return self.document_validator(
+                document, add_op_type=True
+            )
+        return None
+    
     def migrate_indexes(self):
         # TODO: Handle transformations returning more than one document
-        detail = self.IndexDetail(detail=self.detail, logger=self.logger)
-        with self.batch() as batch:
-            for index in self.affected:
-                self.log('Transforming documents in index "%s".', index)
+        # When no detail patterns were given, the lean tracker skips the
+        # per-document snapshot bookkeeping entirely.
+        detail_class = self.IndexDetail if self.detail else self.IndexSummaryDetail
+        detail = detail_class(detail=self.detail, logger=self.logger)
+        # The detail tracker keeps per-document state, so workers reading
+        # different scroll slices - and, now, different indexes - must
+        # take turns updating it.
+        detail_lock = threading.Lock()
+        if self.affected:
+            # Indexes are independent of one another, so migrate several
+            # concurrently; the per-index slice and bulk workers already
+            # overlap network waits, so a modest bound suffices.
+            index_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(8, len(self.affected))
+            )
+            # The hot loop allocates and drops a great many short-lived
+            # dictionaries, none of which form cycles; suspending the
+            # cyclic collector for the duration avoids its repeated
+            # full-heap scans, with periodic explicit collections keeping
+            # the heap in check.
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                futures = [
+                    index_pool.submit(
+                        self.migrate_index_documents, index, detail, detail_lock
+                    )
+                    for index in self.affected
+                ]
+                for future in futures:
+                    future.result()
+            finally:
+                index_pool.shutdown(wait=True)
+                if gc_was_enabled:
+                    gc.enable()
+                gc.collect()
+        detail.report()
+    
+    def migrate_index_documents(self, index, detail, detail_lock):
+        """
+        Transform the documents of one affected index and send the results
+        through the bulk API. Runs on a worker thread when several indexes
+        are migrated concurrently.
+        """
+        self.log('Transforming documents in index "%s".', index)
+        source = index if self.dry else self.get_dummy_index(index)
+        slices = self.get_index_slice_count(index)
+        done = object()
+        output = queue.Queue(maxsize=8)
+        state = {'finished': 0, 'error': None, 'count': 0, 'abort': False}
+        def send(item):
+            # Never block indefinitely on a full queue: if the bulk sender
+            # below dies, it sets the abort flag, and polling it here lets
+            # the scan workers wind down instead of hanging on put.
+            while not state['abort']:
+                try:
+                    output.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+        def scan_slice(slice_id):
+            try:
+                query = dict(self.scan_query)
+                if slices > 1:
+                    query['slice'] = {'id': slice_id, 'max': slices}
+                chunk = []
                 for document in eshelpers.scan(
                     client=self.connection,
-                    preserve_order=True,
-                    index=index if self.dry else self.get_dummy_index(index),
-                    query=self.scan_query
+                    preserve_order=False,
+                    index=source,
+                    size=self.bulk_chunk_size,
+                    scroll='5m',
+                    request_timeout=120,
+                    query=query
                 ):
-                    if not self.dry:
-                        document['_index'] = self.get_original_index(document['_index'])
-                    detail.pre(document)
-                    for migration in self.migrations:
-                        detail.touch(migration)
-                        try:
-                            document = migration.transform_document(document)
-                        except Exception as e:
-                            detail.error(migration, e)
-                            if self.dry:
-                                break
-                            else:
-                                raise e
-                        if document is None:  # Returning None removes the document
-                            detail.delete(migration)
-                            break
-                    detail.post(document)
-                    if document is not None and not self.dry:
-                        batch.add(self.validate_transformed_document(
-                            document, add_op_type=True
-                        ))
-        detail.report()
+                    with detail_lock:
+                        action = self.migrate_document(document, detail)
+                    if action is not None:
+                        chunk.append(action)
+                        if len(chunk) >= self.bulk_chunk_size:
+                            send(chunk)
+                            chunk = []
+                if chunk:
+                    send(chunk)
+                send(done)
+            except BaseException as e:
+                send(e)
+        # The consumer generator drains the queue to completion even on
+        # error, so no worker is left blocked on a full queue; worker
+        # errors are re-raised once the bulk sender has wound down.
+        def consume():
+            while state['finished'] < slices:
+                item = output.get()
+                if item is done:
+                    state['finished'] += 1
+                elif isinstance(item, BaseException):
+                    state['finished'] += 1
+                    if state['error'] is None:
+                        state['error'] = item
+                elif state['error'] is None:
+                    for action in item:
+                        yield action
+                    state['count'] += len(item)
+                    # With the cyclic collector suspended for the hot
+                    # loop, collect explicitly every so often.
+                    if state['count'] >= 100000:
+                        state['count'] = 0
+                        gc.collect()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=slices)
+        try:
+            for i in range(slices):
+                pool.submit(scan_slice, i)
+            errors = []
+            try:
+                for success, info in eshelpers.parallel_bulk(
+                    self.connection, consume(),
+                    thread_count=self.bulk_thread_count,
+                    chunk_size=self.bulk_chunk_size,
+                    max_chunk_bytes=self.bulk_max_chunk_bytes,
+                    raise_on_error=False
+                ):
+                    if not success:
+                        self.error('Failed to index document: %s', info)
+                        errors.append(info)
+            except BaseException:
+                # A transport or serialization error abandoned the consumer
+                # generator mid-iteration. Tell the scan workers to stop
+                # and empty the queue so any worker mid-put gets unstuck
+                # before the pool shutdown below waits on them.
+                state['abort'] = True
+                while True:
+                    try:
+                        output.get_nowait()
+                    except queue.Empty:
+                        break
+                raise
+            if state['error'] is not None:
+                raise state['error']
+            if errors:
+                raise eshelpers.BulkIndexError(
+                    '%s document(s) failed to index.' % len(errors), errors
+                )
+        finally:
+            pool.shutdown(wait=True)
     
     def handle_migration_failure(self, state, exception):
         self.log_exception(state.message, exception=exception)
@@ -894,11 +1645,18 @@ class Migrates(object):
     def revert_indexes_migration(self):
         try:
             self.log('Reverting changes made to Elasticsearch indexes and documents.')
+            # One listing answers every existence question below, instead of
+            # two synchronous round-trips per affected index.
+            existing = set(
+                entry['index'] for entry in self.connection.cat.indices(
+                    h='index', format='json'
+                )
+            )
             for index in self.affected:
-                if self.connection.indices.exists(index=self.get_dummy_index(index)):
+                if self.get_dummy_index(index) in existing:
                     self.log('Recreating affected index "%s".', index)
                     if not self.dry:
-                        if self.connection.indices.exists(index=index):
+                        if index in existing:
                             self.connection.indices.delete(index=index)
                         self.connection.indices.create(
                             index=index, body=self.settings[index]
@@ -907,32 +1665,17 @@ class Migrates(object):
                     self.error('No dummy exists for affected index "%s".', index)
                     self.error('Documents cannot be recovered if the dummy does not exist!')
             self.wait()
-            with self.batch() as batch:
-                for index in self.affected:
-                    dummy = self.get_dummy_index(index)
-                    if not self.connection.indices.exists(index=dummy):
-                        continue
-                    self.log(
-                        'Copying documents from dummy index "%s" to original '
-                        'index "%s".', dummy, index
-                    )
-                    if self.dry:
-                        continue
-                    batch.update(
-                        {
-                            '_op_type': 'index',
-                            '_index': index,
-                            '_type': document['_type'],
-                            '_id': document['_id'],
-                            '_source': document['_source']
-                        }
-                        for document in eshelpers.scan(
-                            client=self.connection,
-                            preserve_order=True,
-                            index=dummy,
-                            query=self.scan_query
-                        )
-                    )
+            for index in self.affected:
+                dummy = self.get_dummy_index(index)
+                if dummy not in existing:
+                    continue
+                self.log(
+                    'Copying documents from dummy index "%s" to original '
+                    'index "%s".', dummy, index
+                )
+                if self.dry:
+                    continue
+                self.reindex_index_documents(dummy, index)
         except BaseException:
             self.log_exception(
                 'Failed to recover data. The original documents should still '
@@ -1005,6 +1748,11 @@ class Migration(object):
         self.target = target
         self.repeat = repeat
         self.internal = internal
+        # Caches for the transform map and for resolved per-index/doc-type
+        # transform functions; both are stable for a migration's lifetime
+        # and sit on the per-document hot path.
+        self.transform_map = None
+        self.transform_cache = {}
         if name is None:
             self.name = target.__class__.__name__
         else:
@@ -1081,7 +1829,9 @@ class Migration(object):
         document's index and doc type, apply the transformation and return the
         result. Otherwise, just return back the original document.
         """
-        transform = self.get_document_transform(document)
+        transform = self.get_transform(document['_index'], document['_type'])
+        if transform is None:
+            return document
         return transform(document)
     
     def get_document_transform(self, document):
@@ -1091,39 +1841,67 @@ class Migration(object):
         If the Migration object does not explicitly define any applicable
         transformation function, a function which simply returns its argument
         is returned.
+        """
+        transform = self.get_transform(document['_index'], document['_type'])
+        if transform is None:
+            return lambda doc: doc
+        return transform
+    
+    def get_transform(self, index, doc_type):
+        """
+        Get the migration's transformation function applying to an index and
+        document type, or None when the migration defines no applicable
+        transformation.
+        The resolution, including its ambiguity checks, runs once per
+        distinct index and document type pair; every following lookup of
+        the same pair is a dictionary access.
+        """
+        key = (index, doc_type)
+        try:
+            return self.transform_cache[key]
+        except KeyError:
+            transform = self.resolve_document_transform(index, doc_type)
+            self.transform_cache[key] = transform
+            return transform
+    
+    def resolve_document_transform(self, index, doc_type):
+        """
+        Resolve the transformation function applying to an index and
+        document type.
+        Returns None when the Migration object does not explicitly define
+        any applicable transformation function.
         If the object defines more than one applicable transformation function,
         then an error is produced because this is considered an ambiguity.
         """
         transform_map = self.transform_documents()
         index_keys = [
-            index for index in transform_map
-            if Migrates.match_pattern(index, document['_index'])
+            index_key for index_key in transform_map
+            if Migrates.match_pattern(index_key, index)
         ]
         if len(index_keys) > 1:
             raise ValueError(
                 'Migration "{0}" attempted to apply multiple transformations to a '
                 'single index, but because the order of these transformations cannot '
                 'be guaranteed this operation is not allowed. The matching index '
-                'keys were {2}.'.format(self.name, index_keys)
+                'keys were {1}.'.format(self.name, index_keys)
             )
         elif index_keys:
             index_key = index_keys[0]
-            doc_type = document['_type']
             doc_type_keys = [
-                doc_type for doc_type in transform_map[index_key]
-                if Migrates.match_pattern(doc_type, document['_type'])
+                doc_type_key for doc_type_key in transform_map[index_key]
+                if Migrates.match_pattern(doc_type_key, doc_type)
             ]
             if len(doc_type_keys) > 1:
                 raise ValueError(
                     'Migration "{0}" attempted to apply multiple transformations to a '
                     'single document type, but because the order of these transformations cannot '
                     'be guaranteed this operation is not allowed. The matching document type '
-                    'keys were {2}.'.format(self.name, doc_type_keys)
+                    'keys were {1}.'.format(self.name, doc_type_keys)
                 )
             elif doc_type_keys:
                 doc_type_key = doc_type_keys[0]
                 return transform_map[index_key][doc_type_key]
-        return lambda doc: doc
+        return None
     
     @staticmethod
     def merge_document_transformations(migrations):
@@ -1132,12 +1910,15 @@ class Migration(object):
         that are affected by the document transformations defined by some
         iterable of Migration objects.
         """
-        transformations = collections.defaultdict(lambda: collections.defaultdict(list))
+        transformations = {}
         for migration in migrations:
             transform = migration.transform_documents()
             for index in transform:
+                bucket = transformations.setdefault(index, {})
                 for doc_type in transform[index]:
-                    transformations[index][doc_type].append(transform[index][doc_type])
+                    bucket.setdefault(doc_type, []).append(
+                        transform[index][doc_type]
+                    )
         return transformations
 
     def transform_documents(self):
@@ -1150,10 +1931,12 @@ class Migration(object):
         When a transformation function returns None, it indicates that the
         received document should be removed from Elasticsearch.
         """
-        if hasattr(self.target, 'transform_documents'):
-            return self.target.transform_documents()
-        else:
-            return {}
+        if self.transform_map is None:
+            if hasattr(self.target, 'transform_documents'):
+                self.transform_map = self.target.transform_documents()
+            else:
+                self.transform_map = {}
+        return self.transform_map
 
     def transform_templates(self, templates):
         """
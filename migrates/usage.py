@@ -2,6 +2,8 @@
 This module documents migrates' command-line interface.
 """
 
+import functools
+
 general_options = """
     -p, --path <paths...>
         Designate one or more paths to Python package directories to be
@@ -52,9 +54,17 @@ migration_options = """
         that the migrates script is located in.
     --no-history
         When this flag is present, migrates won't write migration history
-        information to Elasticsearch."""
-
-general = """
+        information to Elasticsearch.
+    --queue-backend <memory|disk>
+        Select how scanned documents are buffered on their way to the
+        bulk indexing requests made while copying indexes. The default
+        "memory" backend hands documents over through bounded in-memory
+        queues. The "disk" backend spools them through a file under the
+        restore path first, so that scanning out of Elasticsearch is
+        never throttled by bulk-indexing speed; this can help with very
+        large, long-running copies at the cost of disk space."""
+
+general_template = """
 Usage:
     migrates <command> <options...>
 
@@ -105,9 +115,9 @@ Commands:
         detailed help for a command. For example, "migrates help run".
 
 General Options: %s
-""" % general_options
+"""
 
-run = """
+run_template = """
 Usage:
     migrates run <migrations...> <options...>
 
@@ -126,9 +136,9 @@ Description:
 Migration Options: %s
 
 General Options: %s
-""" % (migration_options, general_options)
+"""
 
-reindex = """
+reindex_template = """
 Usage:
     migrates reindex <indexes...> <options...>
 
@@ -152,9 +162,9 @@ Description:
 Migration Options: %s
 
 General Options: %s
-""" % (migration_options, general_options)
+"""
 
-history = """
+history_template = """
 Usage:
     migrates history <begin_time> <end_time> <options...>
 
@@ -174,9 +184,9 @@ Description:
     starting with the first time and ending with the second time is shown.
 
 General Options: %s
-""" % general_options
+"""
 
-migrations = """
+migrations_template = """
 Usage:
     migrates migrations <options...>
 
@@ -193,9 +203,9 @@ Migrations Options:
         those that are registed but have yet to be run.
 
 General Options: %s
-""" % general_options
+"""
 
-restore_templates = """
+restore_templates_template = """
 Usage:
     migrates restore_templates <path> <options...>
 
@@ -209,9 +219,9 @@ Description:
     migration, if normal recovery fails or is prematurely terminated.
 
 General Options: %s
-""" % general_options
+"""
 
-restore_indexes = """
+restore_indexes_template = """
 Usage:
     migrates restore_indexes <path> <options...>
 
@@ -226,9 +236,9 @@ Description:
     migration, if normal recovery fails or is prematurely terminated.
 
 General Options: %s
-""" % general_options
+"""
 
-restore_history = """
+restore_history_template = """
 Usage:
     migrates restore_history <path> <options...>
 
@@ -242,9 +252,9 @@ Description:
     migration, if normal recovery fails or is prematurely terminated.
 
 General Options: %s
-""" % general_options
+"""
 
-restore_cleanup = """
+restore_cleanup_template = """
 Usage:
     migrates restore_cleanup <options...>
 
@@ -268,9 +278,9 @@ Cleanup Options:
         four most recent recovery files of each type.
 
 General Options: %s
-""" % general_options
+"""
 
-remove_history = """
+remove_history_template = """
 Usage:
     migrates remove_history <options...>
 
@@ -283,9 +293,9 @@ Description:
     otherwise specified.
 
 General Options: %s
-""" % general_options
+"""
 
-remove_dummies = """
+remove_dummies_template = """
 Usage:
     migrates remove_dummies <options...>
 
@@ -303,9 +313,9 @@ Description:
     to write and look for its dummies somewhere else. Be careful!
 
 General Options: %s
-""" % general_options
+"""
 
-help = """
+help_template = """
 Usage:
     migrates help <command>
 
@@ -321,20 +331,31 @@ Description:
     "restore_cleanup", "remove_history", "remove_dummies", and "help".
 
 General Options: %s
-""" % general_options
-
-
-
-commands = {
-    'run': run,
-    'reindex': reindex,
-    'history': history,
-    'migrations': migrations,
-    'restore_templates': restore_templates,
-    'restore_indexes': restore_indexes,
-    'restore_history': restore_history,
-    'restore_cleanup': restore_cleanup,
-    'remove_history': remove_history,
-    'remove_dummies': remove_dummies,
-    'help': help,
+"""
+
+
+
+# Maps command names, plus the special "general" entry, to the template
+# for their help text and the option listings to substitute into it.
+# The substitution is deferred until a command's help is actually shown,
+# so importing this module costs no more than reading the strings.
+command_templates = {
+    'general': (general_template, (general_options,)),
+    'run': (run_template, (migration_options, general_options)),
+    'reindex': (reindex_template, (migration_options, general_options)),
+    'history': (history_template, (general_options,)),
+    'migrations': (migrations_template, (general_options,)),
+    'restore_templates': (restore_templates_template, (general_options,)),
+    'restore_indexes': (restore_indexes_template, (general_options,)),
+    'restore_history': (restore_history_template, (general_options,)),
+    'restore_cleanup': (restore_cleanup_template, (general_options,)),
+    'remove_history': (remove_history_template, (general_options,)),
+    'remove_dummies': (remove_dummies_template, (general_options,)),
+    'help': (help_template, (general_options,)),
 }
+
+@functools.lru_cache(maxsize=None)
+def command(name):
+    """Build the full help text for a command the first time it is shown."""
+    template, options = command_templates[name]
+    return template % options
@@ -3,11 +3,14 @@ from setuptools import setup
 __version__ = (0, 1, 0)
 __versionstr__ = '.'.join(str(i) for i in __version__)
 
-with open('readme.md', 'U') as description_file:
+with open('readme.md', 'r', encoding='utf-8') as description_file:
     long_description = description_file.read()
 
-with open('requirements.txt', 'U') as reqs_file:
-    install_requires = reqs_file.read().splitlines()
+with open('requirements.txt', 'r', encoding='utf-8') as reqs_file:
+    install_requires = [
+        line.strip() for line in reqs_file
+        if line.strip() and not line.startswith('#')
+    ]
 
 setup(
     name='migrates',
@@ -15,6 +18,7 @@ setup(
     license='GNU General Public License v3.0',
     url='https://github.com/pineapplemachine/migrates/',
     long_description=long_description,
+    long_description_content_type='text/markdown',
     version=__versionstr__,
     author="Sophie Kirschner",
     author_email='sophiek@pineapplemachine.com',
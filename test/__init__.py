@@ -26,35 +26,36 @@ def __main__():
     
     results_log = sys.argv[1] if len(sys.argv) >= 2 else 'migrates_test_results.log'
     
-    failures = []
-    exceptions = []
+    failure_count = 0
     
-    for test_key, test_module in tests:
-        try:
-            logger.important('Running test "%s".', test_key)
-            test_module.__main__()
-        except Exception as e:
-            logger.exception('Test "%s" failed.', test_key)
-            failures.append(test_key)
-            exceptions.append(traceback.format_exc(e))
-        else:
-            logger.important('Test "%s" succeeded.', test_key)
+    # The results file is line-buffered and written to as each test
+    # finishes: memory stays constant however many tests fail, and a
+    # partial results file survives if the process is killed mid-suite.
+    with open(results_log, 'a', buffering=1) as results_file:
+        results_file.write('RESULTS:\n')
+        for test_key, test_module in tests:
+            try:
+                logger.important('Running test "%s".', test_key)
+                test_module.test_main()
+            except Exception as e:
+                logger.exception('Test "%s" failed.', test_key)
+                failure_count += 1
+                # Format the traceback to a string right away and drop
+                # the exception object, so that anything large hanging
+                # off a failure - response bodies, batch state - isn't
+                # kept alive through the rest of the suite.
+                results_file.write(
+                    'FAILED: %s\n%s\n' % (test_key, traceback.format_exc())
+                )
+                e.__traceback__ = None
+                del e
+            else:
+                logger.important('Test "%s" succeeded.', test_key)
+                results_file.write('PASSED: %s\n' % test_key)
     
     logger.important('Finished running %s tests, encountered %s failures.',
-        len(tests), len(failures)
+        len(tests), failure_count
     )
     
-    with open(results_log, 'a') as results_file:
-        results_file.write('RESULTS:\n')
-        for test_key, test_module in tests:
-            results_file.write('%s: %s\n' % (
-                ('FAILED' if test_key in failures else 'PASSED'), test_key
-            ))
-        if exceptions:
-            results_file.write('EXCEPTIONS:\n')
-            for exception in exceptions:
-                results_file.write(exception + '\n')
-            
-    
 if __name__ == '__main__':
     __main__()
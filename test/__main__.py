@@ -0,0 +1,2 @@
+from . import __main__
+__main__()
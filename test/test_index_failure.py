@@ -5,98 +5,104 @@ migration process, or over several processes.
 """
 
 import elasticsearch
+from elasticsearch import helpers as eshelpers
 
 import migrates
-from .test_utils import callmigrates, iterate_test_data, remove_test_data
-
-
-
-test_template = {
-    "template": "migrates_test",
-    "order": 0,
-    "settings": {},
-    "aliases": {},
-    "mappings": {
-        "test": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
+from .test_utils import (
+    callmigrates, get_connection, iterate_test_data, remove_test_data,
+    test_template
+)
+
+
+
+# Names of the migrations this module registers, so that they can
+# be registered when the test starts and removed when it finishes
+# instead of living in the global registry from import onward.
+migration_names = (
+    'migration_index_fail_test_0',
+    'migration_index_fail_test_1',
+    'migration_index_fail_test_2'
+)
+
+def register_migrations():
+    if migrates.Migrates.contains(migration_names[0]):
+        return
+    @migrates.register('migration_index_fail_test_0', '2017-01-01')
+    class migration_index_fail_test_0(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                x = doc['_source']['x']
+                doc['_source']['y'] = x * x
+                return doc
+            return {
+                'migrates_test_index_fail': {'test': transform}
+            }
+        @staticmethod
+        def transform_templates(templates):
+            templates['migrates_test_template'] = test_template
+            return templates
+
+    @migrates.register('migration_index_fail_test_1', '2017-01-02')
+    class migration_index_fail_test_1(object):
+        @staticmethod
+        def transform_documents():
+            threshold = document_count // 2
+            def transform(doc):
+                if doc['_source']['x'] >= threshold:
+                    raise ValueError('Simulated index migration failure.')
+                return doc
+            return {
+                'migrates_test_index_fail': {'test': transform}
             }
-        }
-    }
-}
-
-
-
-@migrates.register('migration_index_fail_test_0', '2017-01-01')
-class migration_index_fail_test_0(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['y'] = doc['_source']['x'] ** 2
-            return doc
-        return {
-            'migrates_test_index_fail': {'test': transform}
-        }
-    @staticmethod
-    def transform_templates(templates):
-        templates['migrates_test_template'] = test_template
-        return templates
-
-@migrates.register('migration_index_fail_test_1', '2017-01-02')
-class migration_index_fail_test_1(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            if doc['_source']['x'] >= document_count / 2:
-                raise ValueError('Simulated index migration failure.')
-            return doc
-        return {
-            'migrates_test_index_fail': {'test': transform}
-        }
 
-@migrates.register('migration_index_fail_test_2', '2017-01-03')
-class migration_index_fail_test_2(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['y'] = doc['_source']['x'] ** 3
-            return doc
-        return {
-            'migrates_test_index_fail': {'test': transform}
-        }
+    @migrates.register('migration_index_fail_test_2', '2017-01-03')
+    class migration_index_fail_test_2(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                x = doc['_source']['x']
+                doc['_source']['y'] = x * x * x
+                return doc
+            return {
+                'migrates_test_index_fail': {'test': transform}
+            }
 
 
 
 document_count = 500
 
 def insert_test_data(connection):
-    with migrates.Batch(connection, migrates.Logger()) as batch:
-        for i in range(0, document_count):
-            batch.add({
-                '_op_type': 'index',
-                '_index': 'migrates_test_index_fail',
-                '_type': 'test',
-                '_id': str(i),
-                '_source': {'x': i, 'y': 0}
-            })
+    eshelpers.bulk(connection, (
+        {
+            '_op_type': 'index',
+            '_index': 'migrates_test_index_fail',
+            '_type': 'test',
+            '_source': {'x': i, 'y': 0}
+        }
+        for i in range(0, document_count)
+    ), chunk_size=1000, refresh=True)
 
 def validate_test_data(connection):
-    x_set = set()
-    for doc in iterate_test_data(connection):
-        x_set.add(doc['_source']['x'])
+    # Track which x values have been seen as bits of one integer rather
+    # than a set of boxed ints; every x from 0 through document_count - 1
+    # must appear, and duplicates collapse for free.
+    seen = 0
+    for doc in iterate_test_data(connection, includes=['x', 'y']):
         if doc['_source']['y'] != 0:
             return False
-    return len(x_set) == document_count
+        seen |= 1 << doc['_source']['x']
+    return seen == (1 << document_count) - 1
 
 
 
 def patch_revert_indexes_migration(self):
     raise ValueError('Simulated normal recovery failure.')
     
-def __main__():
+def test_main():
+    register_migrations()
     logger = migrates.Logger()
-    connection = elasticsearch.Elasticsearch()
+    connection = get_connection()
     
     logger.log('Removing data from previous tests, if present.')
     remove_test_data(connection)
@@ -114,14 +120,17 @@ def __main__():
             mig.get('migration_index_fail_test_2'),
         ]
         
-        logger.log('Getting current Elasticsearch templates.')
-        original_templates = mig.get_templates()
+        # The failing migration installs migrates_test_template; recovery
+        # must remove it again. Checking that one template's existence is
+        # cheaper than diffing every template on the cluster and is
+        # independent of unrelated templates.
+        assert not connection.indices.exists_template('migrates_test_template')
         
         logger.log('Testing normal recovery from an index migration failure.')
         result = mig.migrate(migrations)
         assert result.fail_state is mig.FailState.MigrateDocuments
         assert validate_test_data(connection)
-        assert mig.get_templates() == original_templates
+        assert not connection.indices.exists_template('migrates_test_template')
         
         logger.log('Running failing migration and simulating normal index recovery failure.')
         migrates.Migrates.revert_indexes_migration = patch_revert_indexes_migration
@@ -132,14 +141,19 @@ def __main__():
         logger.log('Testing manual index recovery.')
         callmigrates('restore_indexes "%s" -y' % result.restore_indexes_path)
         assert validate_test_data(connection)
-        assert mig.get_templates() == original_templates
+        assert not connection.indices.exists_template('migrates_test_template')
         
     finally:
         logger.log('Cleaning up test data from Elasticsearch.')
         remove_test_data(connection)
+        for name in migration_names:
+            migrates.Migrates.remove(name)
+
 
 
+# Kept so the module can still be run directly and by the test runner.
+__main__ = test_main
 
 if __name__ == '__main__':
-    __main__()
+    test_main()
 
@@ -5,54 +5,69 @@ migration process, or over several processes.
 """
 
 import elasticsearch
+from elasticsearch import helpers as eshelpers
 
 import migrates
-from .test_utils import iterate_test_data, remove_test_data
+from .test_utils import get_connection, iterate_test_data, remove_test_data
 
 
 
-@migrates.register('migration_malformed_doc_test_0', '2017-01-01')
-class migration_malformed_doc_test_0(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            del doc['_index']
-            return doc
-        return {
-            'migrates_test_malformed_doc': {'test': transform}
-        }
+# Names of the migrations this module registers, so that they can
+# be registered when the test starts and removed when it finishes
+# instead of living in the global registry from import onward.
+migration_names = (
+    'migration_malformed_doc_test_0',
+)
+
+def register_migrations():
+    if migrates.Migrates.contains(migration_names[0]):
+        return
+    @migrates.register('migration_malformed_doc_test_0', '2017-01-01')
+    class migration_malformed_doc_test_0(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                del doc['_index']
+                return doc
+            return {
+                'migrates_test_malformed_doc': {'test': transform}
+            }
 
 
 
 document_count = 100
 
 def insert_test_data(connection):
-    with migrates.Batch(connection, migrates.Logger()) as batch:
-        for i in range(0, document_count):
-            batch.add({
-                '_op_type': 'index',
-                '_index': 'migrates_test_malformed_doc',
-                '_type': 'test',
-                '_id': str(i),
-                '_source': {'x': i, 'y': 0}
-            })
+    eshelpers.bulk(connection, (
+        {
+            '_op_type': 'index',
+            '_index': 'migrates_test_malformed_doc',
+            '_type': 'test',
+            '_source': {'x': i, 'y': 0}
+        }
+        for i in range(0, document_count)
+    ), chunk_size=1000, refresh=True)
 
 def validate_test_data(connection):
-    x_set = set()
-    for doc in iterate_test_data(connection):
-        x_set.add(doc['_source']['x'])
+    # Track which x values have been seen as bits of one integer rather
+    # than a set of boxed ints; every x from 0 through document_count - 1
+    # must appear, and duplicates collapse for free.
+    seen = 0
+    for doc in iterate_test_data(connection, includes=['x', 'y']):
         if doc['_source']['y'] != 0:
             return False
-    return len(x_set) == document_count
+        seen |= 1 << doc['_source']['x']
+    return seen == (1 << document_count) - 1
 
 
 
 def patch_revert_indexes_migration(self):
     raise ValueError('Simulated normal recovery failure.')
     
-def __main__():
+def test_main():
+    register_migrations()
     logger = migrates.Logger()
-    connection = elasticsearch.Elasticsearch()
+    connection = get_connection()
     
     logger.log('Removing data from previous tests, if present.')
     remove_test_data(connection)
@@ -74,9 +89,14 @@ def __main__():
     finally:
         logger.log('Cleaning up test data from Elasticsearch.')
         remove_test_data(connection)
+        for name in migration_names:
+            migrates.Migrates.remove(name)
+
 
 
+# Kept so the module can still be run directly and by the test runner.
+__main__ = test_main
 
 if __name__ == '__main__':
-    __main__()
+    test_main()
 
@@ -4,27 +4,19 @@ regardless of whether several migrations are evaluated during a single
 migration process, or over several processes.
 """
 
+import copy
+
 import elasticsearch
+from elasticsearch import helpers as eshelpers
 
 import migrates
-from .test_utils import iterate_test_data, remove_test_data
+from .test_utils import (
+    get_connection, iterate_test_data, remove_test_data, test_template
+)
 
 
 
-test_template_0 = {
-    "template": "migrates_test",
-    "order": 0,
-    "settings": {},
-    "aliases": {},
-    "mappings": {
-        "test": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
-            }
-        }
-    }
-}
+test_template_0 = test_template
 
 test_template_1 = {
     "template": "migrates_test",
@@ -44,53 +36,68 @@ test_template_1 = {
 
 
 
-@migrates.register('migration_seq_test_0', '2017-01-01')
-class migration_seq_test_0(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['y'] = doc['_source']['x'] ** 2
-            return doc
-        return {
-            'migrates_test_seq': {'test': transform}
-        }
-    @staticmethod
-    def transform_templates(templates):
-        templates['migrates_test_template'] = test_template_0
-        return templates
-
-@migrates.register('migration_seq_test_1', '2017-01-02')
-class migration_seq_test_1(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['z'] = doc['_source']['y'] ** 2
-            return doc
-        return {
-            'migrates_test_seq': {'test': transform}
-        }
-    @staticmethod
-    def transform_templates(templates):
-        test_template = templates['migrates_test_template']
-        test_template['mappings']['test']['properties']['z'] = {
-            "type": "integer"
-        } 
-        return templates
+# Names of the migrations this module registers, so that they can
+# be registered when the test starts and removed when it finishes
+# instead of living in the global registry from import onward.
+migration_names = (
+    'migration_seq_test_0',
+    'migration_seq_test_1'
+)
+
+def register_migrations():
+    if migrates.Migrates.contains(migration_names[0]):
+        return
+    @migrates.register('migration_seq_test_0', '2017-01-01')
+    class migration_seq_test_0(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                x = doc['_source']['x']
+                doc['_source']['y'] = x * x
+                return doc
+            return {
+                'migrates_test_seq': {'test': transform}
+            }
+        @staticmethod
+        def transform_templates(templates):
+            # Install a copy: the next migration in the sequence modifies the
+            # installed template in place, and the original is shared.
+            templates['migrates_test_template'] = copy.deepcopy(test_template_0)
+            return templates
+
+    @migrates.register('migration_seq_test_1', '2017-01-02')
+    class migration_seq_test_1(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                y = doc['_source']['y']
+                doc['_source']['z'] = y * y
+                return doc
+            return {
+                'migrates_test_seq': {'test': transform}
+            }
+        @staticmethod
+        def transform_templates(templates):
+            test_template = templates['migrates_test_template']
+            test_template['mappings']['test']['properties']['z'] = {
+                "type": "integer"
+            } 
+            return templates
 
 
 
 document_count = 500
 
 def insert_test_data(connection):
-    with migrates.Batch(connection, migrates.Logger()) as batch:
-        for i in range(0, document_count):
-            batch.add({
-                '_op_type': 'index',
-                '_index': 'migrates_test_seq',
-                '_type': 'test',
-                '_id': str(i),
-                '_source': {'x': i}
-            })
+    eshelpers.bulk(connection, (
+        {
+            '_op_type': 'index',
+            '_index': 'migrates_test_seq',
+            '_type': 'test',
+            '_source': {'x': i}
+        }
+        for i in range(0, document_count)
+    ), chunk_size=1000, refresh=True)
 
 def validate_test_data(connection):
     test_template = connection.indices.get_template('migrates_test_template')[
@@ -98,7 +105,7 @@ def validate_test_data(connection):
     ]
     assert(test_template == test_template_1)
     count = 0
-    for doc in iterate_test_data(connection):
+    for doc in iterate_test_data(connection, includes=['x', 'y', 'z']):
         assert doc['_source']['y'] == doc['_source']['x'] ** 2
         assert doc['_source']['z'] == doc['_source']['y'] ** 2
         count += 1
@@ -106,9 +113,10 @@ def validate_test_data(connection):
 
 
 
-def __main__():
+def test_main():
+    register_migrations()
     logger = migrates.Logger()
-    connection = elasticsearch.Elasticsearch()
+    connection = get_connection()
     
     logger.log('Removing data from previous tests, if present.')
     remove_test_data(connection)
@@ -130,15 +138,26 @@ def __main__():
         insert_test_data(connection)
         
         logger.log('Running migrations together.')
-        mig.migrate([mig.get('migration_seq_test_0'), mig.get('migration_seq_test_1')])
+        # The combined run skips the intermediate flush and merge work; one
+        # explicit refresh before validation is all the visibility it needs.
+        mig.migrate(
+            [mig.get('migration_seq_test_0'), mig.get('migration_seq_test_1')],
+            refresh_between=False
+        )
+        connection.indices.refresh('migrates_test_seq')
         validate_test_data(connection)
         
     finally:
         logger.log('Cleaning up test data from Elasticsearch.')
         remove_test_data(connection)
+        for name in migration_names:
+            migrates.Migrates.remove(name)
+
 
 
+# Kept so the module can still be run directly and by the test runner.
+__main__ = test_main
 
 if __name__ == '__main__':
-    __main__()
+    test_main()
 
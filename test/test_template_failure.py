@@ -4,52 +4,69 @@ regardless of whether several migrations are evaluated during a single
 migration process, or over several processes.
 """
 
+import contextlib
+
 import elasticsearch
 
 import migrates
-from .test_utils import callmigrates, remove_test_data
-
-
-
-test_template = {
-    "template": "migrates_test",
-    "order": 0,
-    "settings": {},
-    "aliases": {},
-    "mappings": {
-        "test": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
+from .test_utils import (
+    callmigrates, get_connection, remove_test_data, test_template
+)
+
+
+
+# Names of the migrations this module registers, so that they can
+# be registered when the test starts and removed when it finishes
+# instead of living in the global registry from import onward.
+migration_names = (
+    'migration_template_fail_test_0',
+    'migration_template_fail_test_1'
+)
+
+def register_migrations():
+    if migrates.Migrates.contains(migration_names[0]):
+        return
+    @migrates.register('migration_template_fail_test_0', '2017-01-01')
+    class migration_template_fail_test_0(object):
+        @staticmethod
+        def transform_templates(templates):
+            templates['migrates_test_template'] = test_template
+            return templates
+        @staticmethod
+        def transform_documents():
+            return {
+                'migrates_test_*': {'*': lambda doc: doc}
             }
-        }
-    }
-}
-
-
 
-@migrates.register('migration_template_fail_test_0', '2017-01-01')
-class migration_template_fail_test_0(object):
-    @staticmethod
-    def transform_templates(templates):
-        templates['migrates_test_template'] = test_template
-        return templates
-    @staticmethod
-    def transform_documents():
-        return {
-            'migrates_test_*': {'*': lambda doc: doc}
-        }
-
-@migrates.register('migration_template_fail_test_1', '2017-01-02')
-class migration_template_fail_test_1(object):
-    @staticmethod
-    def transform_templates(templates):
-        raise ValueError('Simulated template migration failure.')
+    @migrates.register('migration_template_fail_test_1', '2017-01-02')
+    class migration_template_fail_test_1(object):
+        @staticmethod
+        def transform_templates(templates):
+            raise ValueError('Simulated template migration failure.')
 
 
 
 original_migrate_templates = migrates.Migrates.migrate_templates
 
+@contextlib.contextmanager
+def patch_migrates(**replacements):
+    """
+    Swap methods on the Migrates class for the duration of one scenario
+    and put the originals back afterward. Patching through one place
+    keeps the class touched a fixed number of times per scenario and
+    guarantees nothing stays patched for whatever test runs next.
+    """
+    originals = {
+        name: getattr(migrates.Migrates, name) for name in replacements
+    }
+    for name, method in replacements.items():
+        setattr(migrates.Migrates, name, method)
+    try:
+        yield
+    finally:
+        for name, method in originals.items():
+            setattr(migrates.Migrates, name, method)
+
 def patch_migrate_templates(self, original, updated):
     # This one is a bit contrived because:
     # 1. The call should simulate a partial failure, i.e. data in Elasticsearch
@@ -64,9 +81,10 @@ def patch_migrate_templates(self, original, updated):
 def patch_revert_template_migration(self):
     raise ValueError('Simulated normal recovery failure.')
     
-def __main__():
+def test_main():
+    register_migrations()
     logger = migrates.Logger()
-    connection = elasticsearch.Elasticsearch()
+    connection = get_connection()
     
     logger.log('Removing data from previous tests, if present.')
     remove_test_data(connection)
@@ -87,15 +105,17 @@ def __main__():
         assert mig.get_templates() == original_templates
         
         logger.log('Testing normal recovery from a persistence failure during template migration.')
-        migrates.Migrates.migrate_templates = patch_migrate_templates
-        result = mig.migrate([mig.get('migration_template_fail_test_0')])
+        with patch_migrates(migrate_templates=patch_migrate_templates):
+            result = mig.migrate([mig.get('migration_template_fail_test_0')])
         assert result.fail_state is mig.FailState.PersistTemplates
         assert mig.get_templates() == original_templates
         
         logger.log('Running failing migration and simulating a normal recovery failure.')
-        migrates.Migrates.migrate_templates = patch_migrate_templates
-        migrates.Migrates.revert_template_migration = patch_revert_template_migration
-        result = mig.migrate([mig.get('migration_template_fail_test_0')])
+        with patch_migrates(
+            migrate_templates=patch_migrate_templates,
+            revert_template_migration=patch_revert_template_migration,
+        ):
+            result = mig.migrate([mig.get('migration_template_fail_test_0')])
         assert result.fail_state is mig.FailState.PersistTemplates
         # Verify assumption that the migration modified template data and that
         # recovery of the original template data did in fact fail.
@@ -108,8 +128,13 @@ def __main__():
     finally:
         logger.log('Cleaning up test data from Elasticsearch.')
         remove_test_data(connection)
+        for name in migration_names:
+            migrates.Migrates.remove(name)
+
 
 
+# Kept so the module can still be run directly and by the test runner.
+__main__ = test_main
 
 if __name__ == '__main__':
-    __main__()
+    test_main()
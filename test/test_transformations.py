@@ -5,56 +5,74 @@ This is an automated test for verifying migration behavior and stability.
 from __future__ import division
 
 import elasticsearch
+from elasticsearch import helpers as eshelpers
 
 import migrates
-from .test_utils import iterate_test_data, remove_test_data
+from .test_utils import get_connection, iterate_test_data, remove_test_data
 
 
 
+# Elasticsearch 6.x indexes are single-type, so every document in the
+# test dataset shares the one mapped type.
+test_properties = {
+    "properties": {
+        "x": {"type": "integer"},
+        "y": {"type": "integer"}
+    }
+}
+
 test_template = {
     "template": "migrates_test_*",
     "order": 0,
     "settings": {},
     "aliases": {},
-    "mappings": {
-        "test_0": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
-            }
-        },
-        "test_1": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
-            }
-        },
-        "test_2": {
-            "properties": {
-                "x": {"type": "integer"},
-                "y": {"type": "integer"}
-            }
-        }
-    }
+    "mappings": {"test": test_properties}
 }
 
 
 document_count = 1200
 
+# Index names are drawn from a small fixed set; build each string once
+# instead of concatenating them per generated document.
+document_indexes = tuple('migrates_test_%d' % k for k in range(6))
+
 
 
 def insert_test_data(connection):
-    with migrates.Batch(connection, migrates.Logger()) as batch:
-        for i in range(0, document_count):
-            batch.add({
-                '_op_type': 'index',
-                '_index': 'migrates_test_' + str(i // 200),
-                '_type': 'test_' + str(i % 3),
-                '_id': str(i),
-                '_source': {
-                    'x': i % 100, 'y': i % 100
-                }
-            })
+    # Create the indexes with refresh and replication disabled so the
+    # bulk load pays for neither, the same trick the migration process
+    # itself uses for its dummy indexes; both are restored below. A
+    # single shard per index keeps each bulk request from fanning out
+    # into per-shard subrequests, which at 200 documents per index
+    # would be all coordination and no parallelism.
+    for index in document_indexes:
+        connection.indices.create(index=index, body={'settings': {'index': {
+            'number_of_shards': '1',
+            'refresh_interval': '-1',
+            'number_of_replicas': '0',
+        }}})
+    # Issue the bulk requests from several threads rather than pushing
+    # the documents one at a time through a Batch; the setup data is
+    # known good, so the Batch's retry and backpressure machinery buys
+    # nothing here. The results generator must be drained for the
+    # requests to actually run.
+    for success, info in eshelpers.parallel_bulk(connection, (
+        {
+            '_op_type': 'index',
+            '_index': document_indexes[i // 200],
+            '_type': 'test',
+            '_source': {
+                'x': i % 100, 'y': i % 100
+            }
+        }
+        for i in range(0, document_count)
+    ), thread_count=4, chunk_size=500):
+        assert success, info
+    connection.indices.put_settings(index='migrates_test_*', body={'index': {
+        'refresh_interval': '1s',
+        'number_of_replicas': '1',
+    }})
+    connection.indices.refresh('migrates_test_*')
 
 def validate_test_template(connection):
     template = connection.indices.get_template('migrates_test_template')
@@ -68,45 +86,62 @@ def remove_migration_history(connection):
 
 
 
-@migrates.register('migration_transform_test_0', '2017-01-01')
-class migration_transform_test_0(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['y'] = doc['_source']['x'] ** 2
-            return doc
-        return {
-            'migrates_test_0': {'test_0': transform}
-        }
+# Names of the migrations this module registers, so that they can
+# be registered when the test starts and removed when it finishes
+# instead of living in the global registry from import onward.
+migration_names = (
+    'migration_transform_test_0',
+    'migration_transform_test_all',
+    'migration_transform_test_remove'
+)
+
+def register_migrations():
+    if migrates.Migrates.contains(migration_names[0]):
+        return
+    @migrates.register('migration_transform_test_0', '2017-01-01')
+    class migration_transform_test_0(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                source = doc['_source']
+                x = source['x']
+                source['y'] = x * x
+                return doc
+            return {
+                'migrates_test_0': {'test': transform}
+            }
 
-@migrates.register('migration_transform_test_all', '2017-01-02')
-class migration_transform_test_all(object):
-    @staticmethod
-    def transform_documents():
-        def transform(doc):
-            doc['_source']['y'] = doc['_source']['x'] ** 2
-            return doc
-        return {
-            'migrates_test_*': {'test_*': transform}
-        }
-    @staticmethod
-    def transform_templates(templates):
-        templates['migrates_test_template'] = test_template
-        return templates
-
-@migrates.register('migration_transform_test_remove', '2017-01-03')
-class migration_transform_test_remove(object):
-    @staticmethod
-    def transform_documents():
-        return {
-            'migrates_test_*': {'test_*': lambda doc: None}
-        }
+    @migrates.register('migration_transform_test_all', '2017-01-02')
+    class migration_transform_test_all(object):
+        @staticmethod
+        def transform_documents():
+            def transform(doc):
+                source = doc['_source']
+                x = source['x']
+                source['y'] = x * x
+                return doc
+            return {
+                'migrates_test_*': {'test*': transform}
+            }
+        @staticmethod
+        def transform_templates(templates):
+            templates['migrates_test_template'] = test_template
+            return templates
+
+    @migrates.register('migration_transform_test_remove', '2017-01-03')
+    class migration_transform_test_remove(object):
+        @staticmethod
+        def transform_documents():
+            return {
+                'migrates_test_*': {'test*': lambda doc: None}
+            }
 
 
 
-def __main__():
+def test_main():
+    register_migrations()
     logger = migrates.Logger()
-    connection = elasticsearch.Elasticsearch()
+    connection = get_connection()
     
     logger.log('Removing current migration history')
     remove_migration_history(connection)
@@ -125,7 +160,7 @@ def __main__():
         mig.dry = True
         mig.migrate([mig.get('migration_transform_test_0'), mig.get('migration_transform_test_all')])
         count = 0
-        for doc in iterate_test_data(connection):
+        for doc in iterate_test_data(connection, includes=['x', 'y']):
             assert doc['_source']['y'] == doc['_source']['x']
             count += 1
         assert count == document_count
@@ -134,8 +169,8 @@ def __main__():
         mig.dry = False
         mig.migrate([mig.get('migration_transform_test_0')])
         count = 0
-        for doc in iterate_test_data(connection):
-            if doc['_index'] == 'migrates_test_0' and doc['_type'] == 'test_0':
+        for doc in iterate_test_data(connection, includes=['x', 'y']):
+            if doc['_index'] == 'migrates_test_0':
                 assert doc['_source']['y'] == doc['_source']['x'] ** 2
             else:
                 assert doc['_source']['y'] == doc['_source']['x']
@@ -145,7 +180,7 @@ def __main__():
         logger.log('Testing migration applying to several indexes and document types.')
         mig.migrate([mig.get('migration_transform_test_all')])
         count = 0
-        for doc in iterate_test_data(connection):
+        for doc in iterate_test_data(connection, includes=['x', 'y']):
             assert doc['_source']['y'] == doc['_source']['x'] ** 2
             count += 1
         assert count == document_count
@@ -153,8 +188,8 @@ def __main__():
         
         logger.log('Testing migration for removing documents.')
         mig.migrate([mig.get('migration_transform_test_remove')])
-        for doc in iterate_test_data(connection):
-            assert False
+        connection.indices.refresh('migrates_test_*')
+        assert connection.count(index='migrates_test_*')['count'] == 0
         
         logger.log('Validating migration history.')
         history = connection.search(index='migrates_history')
@@ -164,8 +199,13 @@ def __main__():
         # All done! Do some cleanup.
         logger.log('Cleaning up test data from Elasticsearch.')
         remove_test_data(connection)
+        for name in migration_names:
+            migrates.Migrates.remove(name)
+
 
 
+# Kept so the module can still be run directly and by the test runner.
+__main__ = test_main
 
 if __name__ == '__main__':
-    __main__()
+    test_main()
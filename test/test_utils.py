@@ -1,33 +1,104 @@
-import subprocess
+import io, shlex, contextlib
 import elasticsearch
 from elasticsearch import helpers as eshelpers
 
 import migrates
+from migrates import cli
 
 
 
 def callmigrates(args):
-    return subprocess.check_output([
-        'python -m migrates.__main__ ' + args
-    ], shell=True).decode('utf-8')
+    """
+    Invoke the migrates command line in-process and return its output.
+    Each call runs against an empty migration registry, restored
+    afterward - the same isolation that spawning a fresh interpreter per
+    invocation used to provide, without paying an interpreter start and
+    a full import of migrates and elasticsearch every time.
+    """
+    registry = dict(migrates.Migrates.registry)
+    migrates.Migrates.registry.clear()
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            try:
+                cli.__main__(cli.Arguments.parse(shlex.split(args)))
+            except SystemExit:
+                pass
+    finally:
+        migrates.Migrates.registry.clear()
+        migrates.Migrates.registry.update(registry)
+    return output.getvalue()
+
+
+
+# One client is shared by every test module: each Elasticsearch()
+# constructor builds its own transport and connection pool, and the
+# suite has no need for seven of them. Reusing one also keeps its
+# keep-alive sockets warm from test to test.
+shared_connection = None
+
+def get_connection():
+    global shared_connection
+    if shared_connection is None:
+        connection_options = {'maxsize': 25, 'http_compress': True}
+        # Serialize request bodies with orjson when it's available, the
+        # same way the CLI sets up its connections; bulk inserts and
+        # scans spend a fair share of their client-side time in json.
+        if migrates.json_serializer is not None:
+            connection_options['serializer'] = migrates.json_serializer
+        shared_connection = elasticsearch.Elasticsearch(**connection_options)
+    return shared_connection
 
 
 
-def iterate_test_data(connection, index='migrates_test_*'):
-    for document in eshelpers.scan(
+# Looked up once; every iterate_test_data call copies this rather than
+# chasing the attribute chain again.
+scan_query = migrates.Migrates.scan_query
+
+def iterate_test_data(connection, index='migrates_test_*', includes=None):
+    # Source filtering goes in the query body rather than a request
+    # parameter because the body form works across every Elasticsearch
+    # version the suite runs against.
+    query = dict(scan_query)
+    if includes is not None:
+        query['_source'] = list(includes)
+    # Closing the scan generator promptly when a caller stops iterating
+    # early - validators return on the first bad document - lets the
+    # client clear the server-side scroll context right away instead of
+    # leaving it to expire on its own.
+    # No caller depends on document order, so don't pay for a sorted
+    # scroll.
+    with contextlib.closing(eshelpers.scan(
         client=connection,
-        preserve_order=True,
+        preserve_order=False,
         index=index,
-        query=migrates.Migrates.scan_query
-    ):
-        yield document
+        query=query
+    )) as documents:
+        for document in documents:
+            yield document
 
 def remove_test_data(connection):
-    try:
-        connection.indices.delete('migrates_test_*')
-    except elasticsearch.exceptions.NotFoundError:
-        pass
-    try:
-        connection.indices.delete_template('migrates_test_template')
-    except elasticsearch.exceptions.NotFoundError:
-        pass
+    # Telling the client to swallow 404s avoids raising and catching an
+    # exception per missing resource on every setup and teardown.
+    connection.indices.delete('migrates_test_*', ignore=404)
+    connection.indices.delete_template('migrates_test_template', ignore=404)
+
+
+# The index template that several of the test migrations install.
+# Transform callbacks assign it into the templates dictionary by
+# reference, so any test whose migrations go on to modify the installed
+# template must copy it first.
+test_template = {
+    "template": "migrates_test",
+    "order": 0,
+    "settings": {},
+    "aliases": {},
+    "mappings": {
+        "test": {
+            "properties": {
+                "x": {"type": "integer"},
+                "y": {"type": "integer"}
+            }
+        }
+    }
+}
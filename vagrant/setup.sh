@@ -25,9 +25,6 @@ echo 'alias migrates="python -m migrates.__main__"' >> $PROFILE
 cd migrates
 
 # Install and start Elasticsearch
-echo "Installing Java 7..."
-apt-get install openjdk-7-jre-headless -y --fix-missing >> 'setup-java.log'
-
 echo "Installing Java 8..."
 apt-get install python-software-properties debconf-utils -y >> 'setup-java.log'
 apt-add-repository ppa:webupd8team/java -y >> 'setup-java.log'
@@ -37,12 +34,8 @@ echo debconf shared/accepted-oracle-license-v1-1 select true | sudo debconf-set-
 echo debconf shared/accepted-oracle-license-v1-1 seen true | sudo debconf-set-selections
 apt-get install oracle-java8-installer -y &>> 'setup-java.log'
 
-echo "Downloading Elasticsearch 1.7.2..."
-wget https://download.elasticsearch.org/elasticsearch/elasticsearch/elasticsearch-1.7.2.deb &>> 'setup-es.log'
-echo "Downloading Elasticsearch 2.4.2..."
-wget https://download.elasticsearch.org/elasticsearch/elasticsearch/elasticsearch-2.4.2.deb &>> 'setup-es.log'
-echo "Downloading Elasticsearch 5.3.0..."
-wget https://artifacts.elastic.co/downloads/elasticsearch/elasticsearch-5.3.0.deb &>> 'setup-es.log'
+echo "Downloading Elasticsearch 6.8.23..."
+wget https://artifacts.elastic.co/downloads/elasticsearch/elasticsearch-6.8.23.deb &>> 'setup-es.log'
 
 # https://github.com/pyenv/pyenv-installer#installation--update--uninstallation
 echo "Installing pyenv..."
@@ -53,10 +46,6 @@ echo 'eval "$(pyenv virtualenv-init -)"' >> $PROFILE
 source $PROFILE
 eval "$(pyenv init -)"
 
-echo "Installing Python 2.7.13..."
-pyenv install 2.7.13 >> 'setup-python-27.log'
-pyenv shell 2.7.13 >> 'setup-python-27.log'
-pip install /migrates/migrates
 echo "Installing Python 3.6.1..."
 pyenv install 3.6.1 >> 'setup-python-36.log'
 pyenv shell 3.6.1 >> 'setup-python-36.log'
@@ -4,55 +4,17 @@ eval "$(pyenv init -)"
 
 touch test.log
 
-pyenv shell 2.7.13
-pip install elasticsearch==1.7.0 &>> "test.log"
 pyenv shell 3.6.1
-pip install elasticsearch==1.7.0 &>> "test.log"
+pip install elasticsearch==6.8.2 &>> "test.log"
 
 sudo /etc/init.d/elasticsearch stop >> "test.log"
 
-echo "  Testing with Elasticsearch 1.7.2..."
-sudo dpkg -i elasticsearch-1.7.2.deb &>> "test.log"
-sudo /etc/init.d/elasticsearch start >> "test.log"
-sleep 12  # Wait for ES to become available
-echo "    Testing with Python 2.7.13..."
-pyenv shell 2.7.13
-python -m test.__init__
-echo "    Testing with Python 3.6.1..."
-pyenv shell 3.6.1
-python -m test.__init__
-sudo /etc/init.d/elasticsearch stop >> "test.log"
-
-echo "  Testing with Elasticsearch 2.4.2..."
-sudo dpkg -i elasticsearch-2.4.2.deb &>> "test.log"
-sudo /etc/init.d/elasticsearch start >> "test.log"
-sleep 15  # Wait for ES to become available
-echo "    Testing with Python 2.7.13..."
-pyenv shell 2.7.13
-python -m test.__init__
-echo "    Testing with Python 3.6.1..."
-pyenv shell 3.6.1
-python -m test.__init__
-sudo /etc/init.d/elasticsearch stop >> "test.log"
-
-echo "  Testing with Elasticsearch 5.3.0..."
-sudo dpkg -i elasticsearch-5.3.0.deb &>> "test.log"
+echo "  Testing with Elasticsearch 6.8.23..."
+sudo dpkg -i elasticsearch-6.8.23.deb &>> "test.log"
 sudo /etc/init.d/elasticsearch start >> "test.log"
 sleep 15  # Wait for ES to become available
-echo "    Testing with Python 2.7.13..."
-pyenv shell 2.7.13
-echo "      Testing with elasticsearch-py 1.7.0..."
-python -m test.__init__
-echo "      Testing with elasticsearch-py 5.3.0..."
-pip install elasticsearch==5.3.0 &>> "test.log"
-python -m test.__init__
 echo "    Testing with Python 3.6.1..."
-pyenv shell 3.6.1
-echo "      Testing with elasticsearch-py 1.7.0..."
-python -m test.__init__
-echo "      Testing with elasticsearch-py 5.3.0..."
-pip install elasticsearch==5.3.0 &>> "test.log"
-python -m test.__init__
+python -m test
 sudo /etc/init.d/elasticsearch stop >> "test.log"
 
 echo "All done running tests!"